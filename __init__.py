@@ -47,6 +47,7 @@ from .ui import ui_main
 from .ui import ui_side
 from .ui import ui_props
 from .ui import ui_settings
+from .ui import ui_stats
 from .ui import ui_menu
 
 
@@ -90,6 +91,7 @@ modules = [
     ui_side,
     ui_props,
     ui_settings,
+    ui_stats,
     ui_menu,
     keymaps,
     properties,
@@ -1,5 +1,4 @@
 import bpy
-import bmesh
 import numpy as np
 from bpy.props import BoolProperty
 from ..classes.operator import Mio3SKOperator
@@ -16,6 +15,11 @@ class OBJECT_OT_mio3sk_apply_to_basis(Mio3SKOperator):
         name="表情の保護を有効",
         description="表情の保護を設定している「まばたき」などのキーに影響を与えないようにします",
     )
+    use_keep_shapes: BoolProperty(
+        name="他のキーの形状を維持",
+        description="他のシェイプキーを新しいBasisに追従させず、現在の形状を維持します",
+        options={"SKIP_SAVE"},
+    )
 
     @classmethod
     def poll(cls, context):
@@ -24,7 +28,10 @@ class OBJECT_OT_mio3sk_apply_to_basis(Mio3SKOperator):
 
     def draw(self, context):
         col = self.layout.column()
-        col.prop(self, "use_protect_delta")
+        col.prop(self, "use_keep_shapes")
+        sub = col.column()
+        sub.active = not self.use_keep_shapes
+        sub.prop(self, "use_protect_delta")
 
     def invoke(self, context, event):
         obj = context.active_object
@@ -46,70 +53,64 @@ class OBJECT_OT_mio3sk_apply_to_basis(Mio3SKOperator):
         shape_keys = obj.data.shape_keys
         basis_kb = shape_keys.reference_key
         active_kb = obj.active_shape_key
-        active_kb_index = obj.active_shape_key_index
 
         if is_edit:
-            obj.active_shape_key_index = 0
-            bpy.ops.mesh.blend_from_shape(shape=active_kb.name, add=False)
-            obj.active_shape_key_index = active_kb_index
+            bpy.ops.object.mode_set(mode="OBJECT")
+            mask = np.zeros(len(obj.data.vertices), dtype=bool)
+            obj.data.vertices.foreach_get("select", mask)
         else:
-            bm = bmesh.new()
-            bm.from_mesh(obj.data)
-            bm.verts.ensure_lookup_table()
-
-            shape_co = [active_kb.data[i].co.copy() for i in range(len(bm.verts))]
-            for i in range(len(bm.verts)):
-                bm.verts[i].co = shape_co[i]
-
-            bm.to_mesh(obj.data)
-            bm.free()
-            obj.data.update()
-        
-        obj.data.update()
-
-        context.window_manager.mio3sk.apply_to_basis = active_kb.name
-
-        if self.use_protect_delta:
-            if is_edit:
-                bpy.ops.object.mode_set(mode="OBJECT")
-
-            v_len = len(basis_kb.data)
-            src_co_flat = np.empty(v_len * 3, dtype=np.float32)
-            bas_co_flat = np.empty(v_len * 3, dtype=np.float32)
-            active_kb.data.foreach_get("co", src_co_flat)
-            basis_kb.data.foreach_get("co", bas_co_flat)
-            delta_co_flat = src_co_flat - bas_co_flat
-
-            bas_co = bas_co_flat.reshape(-1, 3)
-
-            moved_only = True
-            ext_data = obj.mio3sk.ext_data
-            for ext in ext_data:
-                if (target_kb := shape_keys.key_blocks.get(ext.name)) is not None:
-                    if ext.protect_delta:
-                        target_co_flat = np.empty(v_len * 3, dtype=np.float32)
-                        target_kb.data.foreach_get("co", target_co_flat)
+            mask = None
 
-                        target_co = target_co_flat.reshape(-1, 3)
-                        delta_co = delta_co_flat.reshape(-1, 3)
+        if active_kb != basis_kb:
+            protect_names = set()
+            if self.use_protect_delta:
+                protect_names = {ext.name for ext in obj.mio3sk.ext_data if ext.protect_delta}
+            self.apply_to_basis(obj, active_kb, mask, protect_names, self.use_keep_shapes)
+            context.window_manager.mio3sk.apply_to_basis = active_kb.name
 
-                        if moved_only:
-                            moved = np.any(np.abs(target_co - bas_co) > 1e-6, axis=1)
-                            if moved.any():
-                                target_co[moved] += delta_co[moved] * -1
-                        else:
-                            target_co += delta_co * -1
-
-                        target_kb.data.foreach_set("co", target_co_flat)
-
-            obj.data.update()
-
-            if is_edit:
-                bpy.ops.object.mode_set(mode="EDIT")
+        if is_edit:
+            bpy.ops.object.mode_set(mode="EDIT")
 
+        obj.data.update()
         self.print_time()
         return {"FINISHED"}
 
+    @staticmethod
+    def apply_to_basis(obj, source_kb, mask=None, protect_names=None, keep_shapes=False):
+        """source_kb の形状をBasisに適用する（mask の頂点のみ）
+        Basis基準のキーは差分を保つように移動し、protect_names のキーは差分のある頂点を元の位置に残す
+        keep_shapes の場合は他のキーの形状をそのまま維持する
+        """
+        key_blocks = obj.data.shape_keys.key_blocks
+        basis_kb = obj.data.shape_keys.reference_key
+        v_len = len(obj.data.vertices)
+
+        co_buf = np.empty(v_len * 3, dtype=np.float32)
+        co = co_buf.reshape(-1, 3)
+        basis_kb.data.foreach_get("co", co_buf)
+        basis_co = co.copy()
+        source_kb.data.foreach_get("co", co_buf)
+        delta_co = co - basis_co
+        if mask is not None:
+            delta_co[~mask] = 0.0
+        new_basis_co = basis_co + delta_co
+
+        if not keep_shapes:
+            for kb in key_blocks[1:]:
+                if kb.relative_key != basis_kb:
+                    continue
+                kb.data.foreach_get("co", co_buf)
+                if protect_names and kb.name in protect_names:
+                    moved = np.any(np.abs(co - basis_co) > 1e-6, axis=1)
+                    co[~moved] += delta_co[~moved]
+                else:
+                    co += delta_co
+                kb.data.foreach_set("co", co_buf)
+
+        new_basis_flat = new_basis_co.ravel()
+        basis_kb.data.foreach_set("co", new_basis_flat)
+        obj.data.vertices.foreach_set("co", new_basis_flat)
+
 
 classes = [
     OBJECT_OT_mio3sk_apply_to_basis,
@@ -1,5 +1,9 @@
 import bpy
+import numpy as np
+from bpy.props import BoolProperty
 from ..classes.operator import Mio3SKOperator
+from ..utils.mesh import get_vertex_group_weights
+from ..utils.key_stats import invalidate_key_stats
 
 
 class OBJECT_OT_mio3sk_apply_mask(Mio3SKOperator):
@@ -8,39 +12,69 @@ class OBJECT_OT_mio3sk_apply_mask(Mio3SKOperator):
     bl_description = "Apply Mask"
     bl_options = {"REGISTER", "UNDO"}
 
+    selected: BoolProperty(
+        name="Selected",
+        options={"SKIP_SAVE"},
+    )
+
     @classmethod
     def poll(cls, context):
         obj = context.active_object
-        return obj is not None and obj.type == "MESH" and obj.mode == "OBJECT"
+        return obj is not None and obj.type == "MESH" and obj.mode == "OBJECT" and obj.data.shape_keys is not None
+
+    def invoke(self, context, event):
+        if event.alt:
+            self.selected = True
+        return self.execute(context)
 
     def execute(self, context):
         self.start_time()
 
         obj = context.active_object
-        active_shape_key_index = obj.active_shape_key_index
-        active_kb = obj.active_shape_key
-        vertex_groups = obj.vertex_groups.get(active_kb.vertex_group)
-
-        if not vertex_groups:
-            return {"CANCELLED"}
-
         key_blocks = obj.data.shape_keys.key_blocks
 
-        for kb in key_blocks:
-            kb.value = 0.0
-        active_kb.value = 1.0
+        if self.selected:
+            selected_names = {ext.name for ext in obj.mio3sk.ext_data if ext.select}
+            target_key_blocks = [kb for kb in key_blocks[1:] if kb.name in selected_names]
+        else:
+            target_key_blocks = [obj.active_shape_key]
+        target_key_blocks = [kb for kb in target_key_blocks if kb.vertex_group in obj.vertex_groups]
 
-        new_kb = obj.shape_key_add(name="__tmp__", from_mix=True)
-        for i in range(len(obj.data.vertices)):
-            active_kb.data[i].co = new_kb.data[i].co.copy()
-        obj.shape_key_remove(new_kb)
+        if not target_key_blocks:
+            return {"CANCELLED"}
 
-        active_kb.vertex_group = ""
-        obj.active_shape_key_index = active_shape_key_index
+        self.apply_masks(obj, target_key_blocks)
+        invalidate_key_stats(obj, [kb.name for kb in target_key_blocks])
 
+        obj.data.update()
         self.print_time()
         return {"FINISHED"}
 
+    @staticmethod
+    def apply_masks(obj, target_key_blocks):
+        """キーの頂点グループのウェイトを形状に適用して頂点グループを解除する
+        from_mix で作り直した場合と同じく Basis + (key - relative) * weights
+        """
+        v_len = len(obj.data.vertices)
+        weights = get_vertex_group_weights(obj, {kb.vertex_group for kb in target_key_blocks})
+        basis_kb = obj.data.shape_keys.reference_key
+
+        # 対象のキーを基準にしているキーもあるため、書き込む前に基準の形状を読む
+        co_buf = np.empty(v_len * 3, dtype=np.float32)
+        relative_co = {}
+        for rel_kb in [basis_kb] + [kb.relative_key for kb in target_key_blocks]:
+            if rel_kb.name not in relative_co:
+                rel_kb.data.foreach_get("co", co_buf)
+                relative_co[rel_kb.name] = co_buf.reshape(-1, 3).copy()
+        basis_co = relative_co[basis_kb.name]
+
+        co = co_buf.reshape(-1, 3)
+        for kb in target_key_blocks:
+            rel_co = relative_co[kb.relative_key.name]
+            kb.data.foreach_get("co", co_buf)
+            co[:] = basis_co + (co - rel_co) * weights[kb.vertex_group][:, None]
+            kb.data.foreach_set("co", co_buf)
+            kb.vertex_group = ""
 
 classes = [
     OBJECT_OT_mio3sk_apply_mask,
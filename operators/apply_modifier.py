@@ -1,10 +1,29 @@
 import bpy
+import os
+import json
 import time
+import tempfile
+import subprocess
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from bpy.types import Context, Object, PropertyGroup
-from bpy.props import BoolProperty, CollectionProperty
+from bpy.props import BoolProperty, CollectionProperty, IntProperty, StringProperty
 from ..utils.utils import is_local_obj
+from ..utils.key_stats import get_key_stats, invalidate_key_stats
+from ..utils.modifier_map import (
+    get_linear_modifier_map,
+    validate_linear_map,
+    apply_linear_map,
+    build_correspondence,
+    apply_correspondence,
+)
+from ..utils.mesh import get_vertex_group_weights
 from ..classes.operator import Mio3SKOperator
+from ..globals import get_preference_idname
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), "apply_modifier_worker.py")
+# ワーカー1つあたりの制限時間（秒）。超えた場合は失敗としてこのプロセスで適用する
+WORKER_TIMEOUT = 1800
 
 # EXCLUDE_MODIFIERS = {"DECIMATE", "WELD", "EDGE_SPLIT", "REMESH"}
 
@@ -24,6 +43,30 @@ class OBJECT_OT_mio3sk_modifier_apply(Mio3SKOperator):
         description="頂点数が変わる場合ミラーモディフィアのマージオプションはオフにしてください。",
     )
 
+    use_linear_map: BoolProperty(
+        default=True,
+        name="線形なモディファイアを高速に適用",
+        description="ミラー（マージなし）や配列（一定のオフセット）のみの場合、頂点の対応を1回だけ求めて全てのキーに適用します",
+    )
+
+    use_correspondence: BoolProperty(
+        default=True,
+        name="頂点数が変わるキーを対応付けで統合",
+        description="評価すると頂点数が変わるキーは、適用前の頂点（または最も近い面）との対応を使って差分を移します",
+    )
+    use_workers: BoolProperty(
+        default=False,
+        name="バックグラウンドで並列処理",
+        description="オブジェクトごとに一時ファイルに書き出し、複数のBlenderをバックグラウンドで起動して並列に適用します",
+    )
+    max_workers: IntProperty(
+        name="最大プロセス数",
+        default=max(1, min(4, (os.cpu_count() or 1) // 2)),
+        min=1,
+        max=64,
+    )
+    result_path: StringProperty(options={"HIDDEN", "SKIP_SAVE"})
+
     apply_modifiers: CollectionProperty(type=OBJECT_PG_mio3sk_check_modifier)
     # has_shape_keys: BoolProperty(options={"HIDDEN"}, default=False)
 
@@ -57,12 +100,26 @@ class OBJECT_OT_mio3sk_modifier_apply(Mio3SKOperator):
 
         selected_modifiers = [item.name for item in self.apply_modifiers if item.selected]
 
-        error = False
-        for obj in selected_objects:
-            if any(mod.name in selected_modifiers for mod in obj.modifiers):
-                if not self.modifier_apply(context, obj, selected_modifiers):
-                    error = True
-                    self.report({"WARNING"}, "[Object:{}] 一部のシェイプキーが統合できませんでした。Ctrl+Zで元に戻せます。選択キー→「エラー要因のキーを選択」でエラーになるキーを確認できます。".format(obj.name))
+        target_objects = [ob for ob in selected_objects if any(mod.name in selected_modifiers for mod in ob.modifiers)]
+
+        error_objects = []
+        if self.use_workers:
+            worker_objects = [ob for ob in target_objects if self.valid_shape_key(ob) and ob.data.users == 1]
+            if len(worker_objects) > 1:
+                error_objects += self.apply_in_workers(context, worker_objects, selected_modifiers)
+                target_objects = [ob for ob in target_objects if ob not in worker_objects]
+
+        for obj in target_objects:
+            if not self.modifier_apply(context, obj, selected_modifiers):
+                error_objects.append(obj.name)
+
+        for name in error_objects:
+            self.report({"WARNING"}, "[Object:{}] 一部のシェイプキーが統合できませんでした。Ctrl+Zで元に戻せます。選択キー→「エラー要因のキーを選択」でエラーになるキーを確認できます。".format(name))
+        error = bool(error_objects)
+
+        if self.result_path:
+            with open(self.result_path, "w", encoding="utf-8") as f:
+                json.dump({"errors": error_objects}, f)
 
         if not error:
             self.report({"INFO"}, "モディフィアを適用しました")
@@ -89,25 +146,15 @@ class OBJECT_OT_mio3sk_modifier_apply(Mio3SKOperator):
             return True
 
         key_blocks = obj.data.shape_keys.key_blocks
-        basis_kb = obj.data.shape_keys.reference_key
         show_only_shape_key = obj.show_only_shape_key
         obj.show_only_shape_key = False
 
         key_blocks.foreach_set("value", [0.0] * len(key_blocks))
 
-        # 使用していないキー
-        v_len = len(obj.data.vertices)
-        basis_co_flat = np.empty(v_len * 3, dtype=np.float32)
-        basis_kb.data.foreach_get("co", basis_co_flat)
-        basis_co = basis_co_flat.reshape(-1, 3)
-        unused = set()
-        for kb in key_blocks[1:]:
-            shape_co_flat = np.empty(v_len * 3, dtype=np.float32)
-            kb.data.foreach_get("co", shape_co_flat)
-            shape_co = shape_co_flat.reshape(-1, 3)
-            if np.any(np.abs(basis_co - shape_co) > 0.00001):
-                continue
-            unused.add(kb.name)
+        # 使用していないキー（キーを削除するためキャッシュは使わない）
+        invalidate_key_stats(obj)
+        key_stats = get_key_stats(obj)
+        unused = {name for name, stats in key_stats.items() if stats["max_abs"] <= 0.00001}
 
         modifiers_to_keep = set(selected_modifiers)
 
@@ -146,17 +193,45 @@ class OBJECT_OT_mio3sk_modifier_apply(Mio3SKOperator):
         obj.select_set(True)
 
         v_len = len(obj.data.vertices)
+        applied_co = np.empty(v_len * 3, dtype=np.float32)
+        obj.data.vertices.foreach_get("co", applied_co)
+        applied_co = applied_co.reshape(-1, 3)
+
+        # 線形なモディファイアのみの場合は頂点の対応を1回だけ求める
+        linear_map = None
+        copy_basis_kb = copy_obj.data.shape_keys.reference_key
+        copy_v_len = len(copy_basis_kb.data)
+        co_buf = np.empty(copy_v_len * 3, dtype=np.float32)
+        copy_basis_kb.data.foreach_get("co", co_buf)
+        basis_co = co_buf.reshape(-1, 3).copy()
+        if self.use_linear_map:
+            linear_map = get_linear_modifier_map(copy_obj, copy_v_len)
+            if linear_map is not None and not validate_linear_map(linear_map, basis_co, applied_co):
+                linear_map = None
+        self.print("Linear map: {}".format(linear_map is not None))
+
+        relative_co = {copy_basis_kb.name: basis_co}
+        mismatched = []
         error = False
         for kb in copy_key_blocks[1:]:
             if kb.name in unused:
                 new_shape_key = obj.shape_key_add(name=kb.name, from_mix=False)
+            elif linear_map is not None and self.is_linear_key(kb):
+                rel_co = relative_co.get(kb.relative_key.name)
+                if rel_co is None:
+                    kb.relative_key.data.foreach_get("co", co_buf)
+                    rel_co = relative_co[kb.relative_key.name] = co_buf.reshape(-1, 3).copy()
+                kb.data.foreach_get("co", co_buf)
+                new_co = apply_linear_map(linear_map, applied_co, co_buf.reshape(-1, 3) - rel_co)
+                new_shape_key = obj.shape_key_add(name=kb.name, from_mix=False)
+                new_shape_key.data.foreach_set("co", new_co.ravel())
             else:
                 kb.value = 1.0
                 depsgraph = context.evaluated_depsgraph_get()
                 eval_obj = copy_obj.evaluated_get(depsgraph)
                 eval_mesh = eval_obj.to_mesh()
                 if v_len != len(eval_mesh.vertices):
-                    error = True
+                    mismatched.append(kb.name)
                     new_shape_key = obj.shape_key_add(name=kb.name, from_mix=False)
                     # print("[Object:{} Key:{}] 適用後の頂点数が異なるため統合できません".format(obj.name, kb.name))
                 else:
@@ -168,6 +243,32 @@ class OBJECT_OT_mio3sk_modifier_apply(Mio3SKOperator):
                 kb.value = 0.0
             new_shape_key.value = 0.0
 
+        # 頂点数が変わるキーは適用前の頂点との対応を1回だけ求めて差分を移す
+        if mismatched:
+            correspondence = None
+            if self.use_correspondence:
+                correspondence = build_correspondence(context, copy_obj, v_len)
+            if correspondence is None:
+                error = True
+            else:
+                self.print("Correspondence: {}".format(len(mismatched)))
+                new_key_blocks = obj.data.shape_keys.key_blocks
+                weights = get_vertex_group_weights(copy_obj, {copy_key_blocks[name].vertex_group for name in mismatched})
+                for name in mismatched:
+                    kb = copy_key_blocks[name]
+                    rel_co = relative_co.get(kb.relative_key.name)
+                    if rel_co is None:
+                        kb.relative_key.data.foreach_get("co", co_buf)
+                        rel_co = relative_co[kb.relative_key.name] = co_buf.reshape(-1, 3).copy()
+                    kb.data.foreach_get("co", co_buf)
+                    delta = co_buf.reshape(-1, 3) - rel_co
+                    if kb.mute:
+                        delta[:] = 0.0
+                    elif kb.vertex_group in weights:
+                        delta *= weights[kb.vertex_group][:, None]
+                    new_co = apply_correspondence(correspondence, applied_co, delta)
+                    new_key_blocks[name].data.foreach_set("co", new_co.astype(np.float32).ravel())
+
         self.remove_object(copy_obj)
 
         for mod in obj.modifiers:
@@ -183,6 +284,100 @@ class OBJECT_OT_mio3sk_modifier_apply(Mio3SKOperator):
         bpy.data.objects.remove(obj, do_unlink=True)
         bpy.data.meshes.remove(mesh, do_unlink=True)
 
+    def apply_in_workers(self, context: Context, objects, selected_modifiers):
+        """オブジェクトごとにバックグラウンドのBlenderでモディファイアを適用し、結果のメッシュに置き換える
+        エラーのあったオブジェクト名のリストを返す
+        """
+        wm = context.window_manager
+        error_objects = []
+        with tempfile.TemporaryDirectory(prefix="mio3sk_") as tmp_dir:
+            jobs = []
+            for i, obj in enumerate(objects):
+                input_path = os.path.join(tmp_dir, "input_{}.blend".format(i))
+                bpy.data.libraries.write(input_path, {obj}, path_remap="ABSOLUTE")
+                args = {
+                    "addon": get_preference_idname(),
+                    "object": obj.name,
+                    "modifiers": selected_modifiers,
+                    "cancel_mirror_merge": self.cancel_mirror_merge,
+                    "use_linear_map": self.use_linear_map,
+                    "use_correspondence": self.use_correspondence,
+                    "output": os.path.join(tmp_dir, "output_{}.blend".format(i)),
+                    "result": os.path.join(tmp_dir, "result_{}.json".format(i)),
+                }
+                jobs.append((obj, input_path, args))
+
+            wm.progress_begin(0, len(jobs))
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(self.run_worker, input_path, args): (obj, args) for obj, input_path, args in jobs}
+                for count, future in enumerate(as_completed(futures), 1):
+                    wm.progress_update(count)
+                    obj, args = futures[future]
+                    result, log = future.result()
+                    if result is None:
+                        self.print(log)
+                        self.report({"WARNING"}, "[Object:{}] ワーカーの処理に失敗したため、このプロセスで適用します".format(obj.name))
+                        if not self.modifier_apply(context, obj, selected_modifiers):
+                            error_objects.append(obj.name)
+                        continue
+                    self.print("Worker: {} ({:.3f}s)".format(obj.name, result["time"]))
+                    self.relink_mesh(obj, args["output"], result["mesh"], selected_modifiers)
+                    if result["errors"]:
+                        error_objects.append(obj.name)
+            wm.progress_end()
+        return error_objects
+
+    @staticmethod
+    def run_worker(input_path, args):
+        """ワーカーを実行して (結果, ログ) を返す（失敗した場合の結果は None）"""
+        command = [
+            bpy.app.binary_path,
+            "--background",
+            input_path,
+            "--python",
+            WORKER_SCRIPT,
+            "--",
+            json.dumps(args),
+        ]
+        try:
+            process = subprocess.run(
+                command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=WORKER_TIMEOUT
+            )
+        except subprocess.TimeoutExpired as e:
+            output = e.output.decode(errors="replace") if isinstance(e.output, bytes) else e.output
+            return None, "Timeout: {}s\n{}".format(WORKER_TIMEOUT, output or "")
+        if process.returncode != 0 or not os.path.exists(args["output"]):
+            return None, process.stdout
+        with open(args["result"], "r", encoding="utf-8") as f:
+            result = json.load(f)
+        if "mesh" not in result:
+            return None, process.stdout
+        return result, process.stdout
+
+    @staticmethod
+    def relink_mesh(obj: Object, path, mesh_name, selected_modifiers):
+        """ワーカーが書き出したメッシュに置き換え、適用したモディファイアを削除"""
+        with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+            data_to.meshes = [mesh_name]
+        new_mesh = data_to.meshes[0]
+        old_mesh = obj.data
+        for mat in old_mesh.materials:
+            new_mesh.materials.append(mat)
+
+        name = old_mesh.name
+        obj.data = new_mesh
+        bpy.data.meshes.remove(old_mesh)
+        new_mesh.name = name
+
+        for modifier_name in selected_modifiers:
+            if mod := obj.modifiers.get(modifier_name):
+                obj.modifiers.remove(mod)
+
+    @staticmethod
+    def is_linear_key(kb):
+        """評価せずに差分だけで求められるキー（ミュートや頂点グループのマスクがない）"""
+        return not kb.mute and not kb.vertex_group and kb.slider_min <= 1.0 <= kb.slider_max
+
     @staticmethod
     def valid_shape_key(obj):
         return obj.type == "MESH" and obj.data.shape_keys is not None and 0 <= obj.active_shape_key_index
@@ -199,6 +394,12 @@ class OBJECT_OT_mio3sk_modifier_apply(Mio3SKOperator):
         col = layout.column()
         col.label(text="Options")
         col.prop(self, "cancel_mirror_merge")
+        col.prop(self, "use_linear_map")
+        col.prop(self, "use_correspondence")
+        col.prop(self, "use_workers")
+        row = col.row()
+        row.active = self.use_workers
+        row.prop(self, "max_workers")
 
             # box = layout.box()
             # col = box.column(align=True)
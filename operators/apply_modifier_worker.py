@@ -0,0 +1,54 @@
+"""モディファイア適用のワーカー（blender --background で実行するスクリプト）
+
+blender --background <input.blend> --python apply_modifier_worker.py -- <json>
+json: {"addon", "object", "modifiers", "cancel_mirror_merge", "use_linear_map", "use_correspondence", "output", "result"}
+"""
+
+import sys
+import json
+import time
+import bpy
+import addon_utils
+
+
+def main():
+    args = json.loads(sys.argv[sys.argv.index("--") + 1])
+    start_time = time.time()
+
+    if not hasattr(bpy.types, "OBJECT_OT_mio3sk_modifier_apply"):
+        addon_utils.enable(args["addon"], default_set=False)
+
+    # libraries.write で書き出したオブジェクトはシーンにリンクされていない
+    scene = bpy.context.scene
+    for ob in bpy.data.objects:
+        if not ob.users_scene:
+            scene.collection.objects.link(ob)
+
+    obj = bpy.data.objects[args["object"]]
+    for ob in bpy.context.view_layer.objects:
+        ob.select_set(ob == obj)
+    bpy.context.view_layer.objects.active = obj
+
+    bpy.ops.object.mio3sk_modifier_apply(
+        apply_modifiers=[{"name": name, "selected": True} for name in args["modifiers"]],
+        cancel_mirror_merge=args["cancel_mirror_merge"],
+        use_linear_map=args["use_linear_map"],
+        use_correspondence=args["use_correspondence"],
+        use_workers=False,
+        result_path=args["result"],
+    )
+
+    # マテリアルは元のファイルのものを使うため書き出さない
+    mesh = obj.data
+    mesh.materials.clear()
+    bpy.data.libraries.write(args["output"], {mesh}, path_remap="ABSOLUTE")
+
+    with open(args["result"], "r", encoding="utf-8") as f:
+        result = json.load(f)
+    result["mesh"] = mesh.name
+    result["time"] = time.time() - start_time
+    with open(args["result"], "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+main()
@@ -1,36 +1,195 @@
 import bpy
+import numpy as np
+from bpy.props import BoolProperty, EnumProperty, FloatProperty
 from ..classes.operator import Mio3SKOperator
+from ..utils.utils import is_local_obj, valid_shape_key
+from ..utils.ext_data import refresh_data
+from ..utils.key_stats import invalidate_key_stats
+
+BAKE_ATTR_PREFIX = "BakeShapeKey_"
+
+
+def bake_deltas_to_attributes(obj, key_blocks, storage="FLOAT", threshold=0.0):
+    """キーの移動量（Basisとの差分）をメッシュ属性にベイクする
+    HALF は float16 の精度に丸め、SPARSE は threshold 以下の移動量を0にして移動のないキーを省く
+    ベイクした属性名のリストを返す
+    """
+    mesh = obj.data
+    basis_kb = mesh.shape_keys.reference_key
+    v_len = len(mesh.vertices)
+
+    co_buf = np.empty(v_len * 3, dtype=np.float32)
+    basis_kb.data.foreach_get("co", co_buf)
+    basis_co = co_buf.copy()
+
+    baked = []
+    for kb in key_blocks:
+        kb.data.foreach_get("co", co_buf)
+        delta = co_buf - basis_co
+        if storage == "HALF":
+            delta = delta.astype(np.float16).astype(np.float32)
+        elif storage == "SPARSE":
+            delta3 = delta.reshape(-1, 3)
+            delta3[np.linalg.norm(delta3, axis=1) <= threshold] = 0.0
+            if not delta.any():
+                continue
+
+        attr_name = BAKE_ATTR_PREFIX + kb.name
+        attr = mesh.attributes.get(attr_name)
+        if attr and (attr.data_type != "FLOAT_VECTOR" or attr.domain != "POINT"):
+            mesh.attributes.remove(attr)
+            attr = None
+        if not attr:
+            attr = mesh.attributes.new(name=attr_name, type="FLOAT_VECTOR", domain="POINT")
+        attr.data.foreach_set("vector", delta)
+        baked.append(attr_name)
+    return baked
+
+
+def restore_deltas_from_attributes(obj, attr_names):
+    """ベイクした属性からシェイプキーを復元する（既存のキーは上書き）
+    復元したキー名のリストを返す
+    """
+    mesh = obj.data
+    key_blocks = mesh.shape_keys.key_blocks
+    basis_kb = mesh.shape_keys.reference_key
+    v_len = len(mesh.vertices)
+
+    basis_co = np.empty(v_len * 3, dtype=np.float32)
+    basis_kb.data.foreach_get("co", basis_co)
+    co_buf = np.empty(v_len * 3, dtype=np.float32)
+
+    restored = []
+    for attr_name in attr_names:
+        attr = mesh.attributes[attr_name]
+        name = attr_name[len(BAKE_ATTR_PREFIX) :]
+        kb = key_blocks.get(name)
+        if kb is None:
+            kb = obj.shape_key_add(name=name, from_mix=False)
+        attr.data.foreach_get("vector", co_buf)
+        co_buf += basis_co
+        kb.data.foreach_set("co", co_buf)
+        restored.append(kb.name)
+    return restored
+
+
+def get_baked_attributes(obj):
+    return [
+        attr.name
+        for attr in obj.data.attributes
+        if attr.name.startswith(BAKE_ATTR_PREFIX) and attr.data_type == "FLOAT_VECTOR" and attr.domain == "POINT"
+    ]
 
 
 class OBJECT_OT_mio3sk_bake_attr(Mio3SKOperator):
     bl_idname = "object.mio3sk_bake_attr"
     bl_label = "アクティブキーを属性にベイク"
-    bl_description = "アクティブキーの移動量をメッシュ属性にベイクします"
+    bl_description = "アクティブキーの移動量をメッシュ属性にベイクします（Alt: 選択したキー）"
+    bl_options = {"REGISTER", "UNDO"}
+
+    selected: BoolProperty(
+        name="Selected",
+        options={"SKIP_SAVE"},
+    )
+    storage: EnumProperty(
+        name="Storage",
+        items=[
+            ("FLOAT", "Float", ""),
+            ("HALF", "Float16", "移動量を float16 の精度に丸めます"),
+            ("SPARSE", "Sparse", "閾値以下の移動量を0にし、移動のないキーはベイクしません"),
+        ],
+    )
+    threshold: FloatProperty(
+        name="Threshold",
+        default=0.00001,
+        min=0.0,
+        step=0.001,
+        precision=6,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and valid_shape_key(obj) and obj.mode == "OBJECT"
+
+    def invoke(self, context, event):
+        if event.alt:
+            self.selected = True
+        return self.execute(context)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.use_property_split = True
+        layout.prop(self, "selected")
+        layout.prop(self, "storage")
+        row = layout.row()
+        row.active = self.storage == "SPARSE"
+        row.prop(self, "threshold")
+
+    def execute(self, context):
+        self.start_time()
+        obj = context.active_object
+        if not is_local_obj(obj):
+            return {"CANCELLED"}
+
+        key_blocks = obj.data.shape_keys.key_blocks
+        if self.selected:
+            selected_names = {ext.name for ext in obj.mio3sk.ext_data if ext.select}
+            target_key_blocks = [kb for kb in key_blocks[1:] if kb.name in selected_names]
+        else:
+            target_key_blocks = [obj.active_shape_key]
+
+        baked = bake_deltas_to_attributes(obj, target_key_blocks, self.storage, self.threshold)
+        self.print("Bake {} keys".format(len(baked)))
+
+        self.print_time()
+        return {"FINISHED"}
+
+
+class OBJECT_OT_mio3sk_restore_attr(Mio3SKOperator):
+    bl_idname = "object.mio3sk_restore_attr"
+    bl_label = "属性からシェイプキーを復元"
+    bl_description = "ベイクしたメッシュ属性からシェイプキーを復元します"
     bl_options = {"REGISTER", "UNDO"}
 
+    remove_attributes: BoolProperty(name="属性を削除")
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == "MESH" and obj.mode == "OBJECT"
+
     def execute(self, context):
         self.start_time()
         obj = context.active_object
-        shape_keys = context.active_object.data.shape_keys
+        if not is_local_obj(obj):
+            return {"CANCELLED"}
 
-        basis = shape_keys.reference_key
-        target = obj.active_shape_key
+        attr_names = get_baked_attributes(obj)
+        if not attr_names:
+            return {"CANCELLED"}
 
-        attr_name = "BakeShapeKey_{}".format(target.name)
+        if obj.data.shape_keys is None:
+            obj.shape_key_add(name="Basis", from_mix=False)
 
-        attr = obj.data.attributes.get(attr_name)
-        if not attr:
-            attr = obj.data.attributes.new(name=attr_name, type="FLOAT_VECTOR", domain="POINT")
+        restored = restore_deltas_from_attributes(obj, attr_names)
+        invalidate_key_stats(obj, restored)
+        if self.remove_attributes:
+            for attr_name in attr_names:
+                obj.data.attributes.remove(obj.data.attributes[attr_name])
 
-        for i, data in enumerate(attr.data):
-            delta = target.data[i].co - basis.data[i].co
-            data.vector = delta
+        obj.data.update()
+        refresh_data(context, obj, check=True, group=True)
+        self.print("Restore {} keys".format(len(restored)))
 
         self.print_time()
         return {"FINISHED"}
 
 
-classes = [OBJECT_OT_mio3sk_bake_attr]
+classes = [
+    OBJECT_OT_mio3sk_bake_attr,
+    OBJECT_OT_mio3sk_restore_attr,
+]
 
 
 def register():
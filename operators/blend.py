@@ -5,7 +5,9 @@ from bpy.types import PropertyGroup
 from bpy.props import BoolProperty, FloatProperty, StringProperty, EnumProperty, CollectionProperty
 from ..classes.operator import Mio3SKOperator
 from ..utils.utils import is_local_obj, valid_shape_key
-from ..utils.mesh import find_x_mirror_verts
+from ..utils.mesh import mirror_mask_x, find_region_boundary, calc_boundary_distance
+from ..utils.smooth import get_mesh_edges
+from ..utils.key_stats import invalidate_key_stats
 
 def update_props(self, context):
     context.scene.mio3sk.blend = self.blend
@@ -33,6 +35,13 @@ class MESH_OT_mio3sk_blend(Mio3SKOperator):
             ("linear", "Linear", ""),
         ],
     )
+    distance: EnumProperty(
+        name="Distance",
+        items=[
+            ("EUCLIDEAN", "Euclidean", "境界からの直線距離"),
+            ("GEODESIC", "Geodesic", "辺をたどった境界からの距離"),
+        ],
+    )
     blend_source: StringProperty(name="Shape")
     from_history: StringProperty(name="履歴から選択", options={"SKIP_SAVE"})
     select_history: CollectionProperty(
@@ -101,6 +110,7 @@ class MESH_OT_mio3sk_blend(Mio3SKOperator):
                 result = (1 - self.blend) * target_co + self.blend * source_co
 
             target_kb.data.foreach_set("co", result.reshape(num_verts * 3))
+            invalidate_key_stats(obj, [target_kb.name])
             obj.data.update()
             # self.print_time()
             return {"FINISHED"}
@@ -119,21 +129,29 @@ class MESH_OT_mio3sk_blend(Mio3SKOperator):
         bm = bmesh.from_edit_mesh(obj.data)
         bm.verts.ensure_lookup_table()
 
-        selected_verts = {v for v in bm.verts if v.select}
+        obj.update_from_editmode()
+        num_verts = len(obj.data.vertices)
+        selected_mask = np.zeros(num_verts, dtype=bool)
+        obj.data.vertices.foreach_get("select", selected_mask)
         if obj.use_mesh_mirror_x:
-            selected_verts.update(find_x_mirror_verts(bm, selected_verts))
+            selected_mask = mirror_mask_x(obj, selected_mask)
 
-        if not selected_verts:
+        if not selected_mask.any():
             self.report({"WARNING"}, "No vertices selected")
             return {"CANCELLED"}
 
-        selected_verts_list = sorted(selected_verts, key=lambda v: v.index)
-        selected_verts_indices = [v.index for v in selected_verts_list]
-        basis_co = np.array([basis_kb.data[i].co for i in selected_verts_indices])
-        source_co = np.array([blend_source.data[i].co for i in selected_verts_indices])
-        target_co = np.array([v.co for v in selected_verts_list])
+        selected_verts_indices = np.flatnonzero(selected_mask)
 
-        weights = self.calc_weights_shape(selected_verts_list, target_co)
+        co_buf = np.empty(num_verts * 3, dtype=np.float32)
+        obj.active_shape_key.data.foreach_get("co", co_buf)
+        all_target_co = co_buf.reshape(-1, 3).copy()
+        basis_kb.data.foreach_get("co", co_buf)
+        basis_co = co_buf.reshape(-1, 3)[selected_verts_indices]
+        blend_source.data.foreach_get("co", co_buf)
+        source_co = co_buf.reshape(-1, 3)[selected_verts_indices]
+        target_co = all_target_co[selected_verts_indices]
+
+        weights = self.calc_weights_shape(obj, all_target_co, selected_mask)
         weights /= np.max(weights)
         weights = weights * self.blend
 
@@ -144,8 +162,9 @@ class MESH_OT_mio3sk_blend(Mio3SKOperator):
             weight_col = weights[:, np.newaxis]
             result = (1 - weight_col) * target_co + weight_col * source_co
 
-        for v, new_co in zip(selected_verts_list, result):
-            v.co = new_co
+        verts = bm.verts
+        for i, new_co in zip(selected_verts_indices.tolist(), result.tolist()):
+            verts[i].co = new_co
 
         bm.normal_update()
         bmesh.update_edit_mesh(obj.data)
@@ -154,38 +173,21 @@ class MESH_OT_mio3sk_blend(Mio3SKOperator):
         return {"FINISHED"}
 
     # ウェイト計算(シェイプ)
-    def calc_weights_shape(self, selected_verts, target_co):
-        vert_to_idx = {v: i for i, v in enumerate(selected_verts)}
-
-        boundary_verts = []
-        boundary_indices = []
-        interior_indices = []
-
-        for i, v in enumerate(selected_verts):
-            is_boundary = False
-            for edge in v.link_edges:
-                other_v = edge.other_vert(v)
-                if other_v not in vert_to_idx:
-                    is_boundary = True
-                    boundary_verts.append(v)
-                    boundary_indices.append(i)
-                    break
-            if not is_boundary:
-                interior_indices.append(i)
-
-        num_verts = len(selected_verts)
-        distances = np.zeros(num_verts)
-
-        if not boundary_verts:
+    def calc_weights_shape(self, obj, co, selected_mask):
+        edges = get_mesh_edges(obj)
+        boundary = find_region_boundary(edges, selected_mask)[selected_mask]
+        distances = calc_boundary_distance(co, edges, selected_mask, geodesic=self.distance == "GEODESIC")
+        distances = distances[selected_mask]
+
+        if not boundary.any():
             distances[:] = 1  # 境界がない場合
-        elif not interior_indices:
+        elif boundary.all():
             distances[:] = 1  # 境界頂点しかない場合
         else:
-            boundary_co = np.array([v.co for v in boundary_verts])
-            interior_target_co = target_co[interior_indices]
-            all_distances = np.linalg.norm(interior_target_co[:, np.newaxis] - boundary_co, axis=2)
-            distances[interior_indices] = np.min(all_distances, axis=1)
-            distances[boundary_indices] = 0.001
+            distances[boundary] = 0.001
+            # 境界に到達できない頂点
+            finite = np.isfinite(distances)
+            distances[~finite] = distances[finite].max()
 
         max_distance = np.max(distances)
         if max_distance < 1e-6:
@@ -234,10 +236,11 @@ class MESH_OT_mio3sk_blend(Mio3SKOperator):
         row = box.split(factor=0.35)
         row.prop(self, "smooth")
 
-        col = row.row()
+        col = row.column()
         if not self.smooth:
             col.enabled = False
         col.prop(self, "falloff", text="")
+        col.prop(self, "distance", text="")
 
 
 class WM_OT_blend_set_key(Mio3SKOperator):
@@ -4,6 +4,33 @@ import numpy as np
 from bpy.props import BoolProperty, FloatProperty, EnumProperty
 from ..classes.operator import Mio3SKOperator
 from ..utils.utils import is_local_obj, valid_shape_key
+from ..utils.key_stats import invalidate_key_stats
+
+
+def find_clean_verts(shape_xyz, basis_xyz, threshold):
+    """Basisからの移動量が 0 より大きく threshold 以下の頂点のマスク"""
+    delta = shape_xyz - basis_xyz
+    dist_sq = np.einsum("ij,ij->i", delta, delta)
+    return (dist_sq > 0) & (dist_sq <= threshold * threshold)
+
+
+def clean_shape_keys(key_blocks, names, basis_xyz, threshold) -> dict[str, int]:
+    """シェイプキーの小さな移動をリセットし、キーごとのリセットした頂点数を返す
+    バッファは使い回し、リセットする頂点がないキーは書き込まない
+    """
+    co_buf = np.empty(basis_xyz.size, dtype=np.float32)
+    shape_xyz = co_buf.reshape(-1, 3)
+    counts = {}
+    for name in names:
+        kb = key_blocks[name]
+        kb.data.foreach_get("co", co_buf)
+        mask = find_clean_verts(shape_xyz, basis_xyz, threshold)
+        count = int(np.count_nonzero(mask))
+        if count:
+            shape_xyz[mask] = basis_xyz[mask]
+            kb.data.foreach_set("co", co_buf)
+        counts[name] = count
+    return counts
 
 
 class MESH_OT_mio3sk_clean(Mio3SKOperator):
@@ -56,15 +83,16 @@ class MESH_OT_mio3sk_clean(Mio3SKOperator):
         basis_kb.data.foreach_get("co", basis_co)
         basis_xyz = basis_co.reshape(-1, 3)
 
-        shape_co = np.array([v.co for v in bm.verts])
-        distances = np.linalg.norm(shape_co - basis_xyz, axis=1)
-        movement_mask = (distances > 0) & (distances <= self.threshold)
+        # update_from_editmode 後のアクティブキーは編集中の座標
+        shape_co = np.empty(v_len * 3, dtype=np.float32)
+        obj.active_shape_key.data.foreach_get("co", shape_co)
+        movement_mask = find_clean_verts(shape_co.reshape(-1, 3), basis_xyz, self.threshold)
 
-        cleaned_count = 0
-        for idx, mask in enumerate(movement_mask):
-            if mask:
-                bm.verts[idx].co = basis_xyz[idx].copy()
-                cleaned_count += 1
+        clean_indices = np.flatnonzero(movement_mask)
+        verts = bm.verts
+        for idx, co in zip(clean_indices.tolist(), basis_xyz[clean_indices].tolist()):
+            verts[idx].co = co
+        cleaned_count = len(clean_indices)
 
         bmesh.update_edit_mesh(obj.data)
 
@@ -142,24 +170,16 @@ class OBJECT_OT_mio3sk_clean_selected(Mio3SKOperator):
         basis_kb.data.foreach_get("co", basis_co)
         basis_xyz = basis_co.reshape(-1, 3)
 
-        threshold = self.threshold
-        active_index = obj.active_shape_key_index
-        for kb in key_blocks[1:]:
-            if kb.name not in selected_names or kb == basis_kb:
-                continue
-            obj.active_shape_key_index = key_blocks.find(kb.name)
-            
-            shape_co = np.empty(v_len * 3, dtype=np.float32)
-            kb.data.foreach_get("co", shape_co)
-            shape_xyz = shape_co.reshape(-1, 3)
-
-            dist = np.linalg.norm(shape_xyz - basis_xyz, axis=1)
-            small_movement_mask = (dist > 0) & (dist <= threshold)
-            new_co = shape_xyz.copy()
-            new_co[small_movement_mask] = basis_xyz[small_movement_mask]
-            kb.data.foreach_set("co", new_co.ravel())
-
-        obj.active_shape_key_index = active_index
+        names = [kb.name for kb in key_blocks[1:] if kb.name in selected_names and kb != basis_kb]
+        counts = clean_shape_keys(key_blocks, names, basis_xyz, self.threshold)
+        invalidate_key_stats(obj, [name for name, count in counts.items() if count])
+        for name, count in counts.items():
+            if count:
+                self.print("{}: {}".format(name, count))
+
+        cleaned_keys = sum(1 for count in counts.values() if count)
+        if cleaned_keys:
+            self.report({"INFO"}, "Cleaned {} vertices in {} keys".format(sum(counts.values()), cleaned_keys))
 
         obj.data.update()
         self.print_time()
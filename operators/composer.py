@@ -5,7 +5,9 @@ from bpy.props import BoolProperty, IntProperty, EnumProperty
 from bpy.app.translations import pgettext_iface as tt_iface
 from ..classes.operator import Mio3SKOperator
 from ..utils.utils import is_local_obj, valid_shape_key
-from ..utils.ext_data import refresh_data
+from ..utils.ext_data import refresh_data, invalidate_group_cache
+from ..utils.mesh import calc_side_weights
+from ..utils.key_stats import invalidate_key_stats
 
 
 class Mio3SKComposerEditOperator(Mio3SKOperator):
@@ -73,6 +75,7 @@ class OBJECT_OT_mio3sk_composer_rule_create(Mio3SKComposerEditOperator):
         if ext is None:
             ext = prop_o.ext_data.add()
             ext.name = obj.active_shape_key.name
+            invalidate_group_cache(obj)
 
         ext.composer_enabled = True
         ext.composer_source.clear()
@@ -362,22 +365,8 @@ class OBJECT_OT_mio3sk_composer_apply(Mio3SKComposerEditOperator):
         if ext.composer_type == "MIRROR":
             result_co = self.mirror(basis_co, buffer_co, mirror_indices)
         elif ext.composer_type in {"+X", "-X"}:
-            radius = ext.composer_smoothing_radius
-            x = basis_co[:, 0]
-            if radius <= 0.0:
-                is_pos = x > np.float32(0.0)
-                is_neg = x < np.float32(0.0)
-                is_center = ~(is_pos | is_neg)
-                if ext.composer_type == "+X":
-                    weight = is_pos.astype(np.float32) + is_center.astype(np.float32) * np.float32(0.5)
-                else:
-                    weight = is_neg.astype(np.float32) + is_center.astype(np.float32) * np.float32(0.5)
-            else:
-                radius_f = np.float32(abs(radius))
-                t = (x + radius_f) / (np.float32(2.0) * radius_f)
-                t = np.clip(t, np.float32(0.0), np.float32(1.0))
-                t = t * t * (np.float32(3.0) - np.float32(2.0) * t)
-                weight = t if ext.composer_type == "+X" else (np.float32(1.0) - t)
+            weight_l, weight_r = calc_side_weights(basis_co[:, 0], abs(ext.composer_smoothing_radius))
+            weight = weight_l if ext.composer_type == "+X" else weight_r
             result_co = basis_co + (buffer_co - basis_co) * weight[:, None]
         elif ext.composer_type == "INVERT":
             basis_co_flat = basis_co.ravel()
@@ -386,6 +375,7 @@ class OBJECT_OT_mio3sk_composer_apply(Mio3SKComposerEditOperator):
             result_co = buffer_co
 
         target_kb.data.foreach_set("co", result_co.ravel())
+        invalidate_key_stats(obj, [target_kb.name])
 
         obj.shape_key_remove(buffer_kb)
 
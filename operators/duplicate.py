@@ -8,9 +8,17 @@ from bpy.props import BoolProperty, FloatProperty, EnumProperty
 from bpy.app.translations import pgettext_iface as tt_iface
 from gpu_extras.batch import batch_for_shader
 from ..classes.operator import Mio3SKOperator
-from ..utils.utils import is_local_obj, has_shape_key, valid_shape_key, move_shape_key_below, clear_shape_keys_selection
+from ..utils.utils import (
+    is_local_obj,
+    has_shape_key,
+    valid_shape_key,
+    move_shape_key_below,
+    clear_shape_keys_selection,
+    reorder_shape_keys,
+)
 from ..utils.ext_data import refresh_data, add_ext_data, copy_ext_info, create_composer_rule
 from ..utils.mirror import get_mirror_name, parse_side_name
+from ..utils.mesh import calc_side_weights
 
 
 class OBJECT_OT_mio3sk_duplicate(Mio3SKOperator):
@@ -219,27 +227,24 @@ class OBJECT_OT_mio3sk_generate_lr(Mio3SKOperator):
 
         selected_names = self.get_selected_names(obj, self.mode, sort=True)
 
-        for name in selected_names:
-            new_kb_l, new_kb_r = self.create_shape_key(context, obj, key_blocks, name)
-            if new_kb_l is None or new_kb_r is None:
-                continue
-
-            key_names.insert(key_names.index(name) + 1, new_kb_l.name)
-            key_names.insert(key_names.index(name) + 2, new_kb_r.name)
+        created = self.create_shape_keys(obj, key_blocks, selected_names)
+        for name, new_name_l, new_name_r in created:
+            idx = key_names.index(name)
+            key_names[idx + 1 : idx + 1] = [new_name_l, new_name_r]
 
         if len(key_names) != before_len:
             clear_shape_keys_selection(key_blocks)
-
-            first_idx = key_names.index(selected_names[0])
-            sorded_names = key_names[first_idx:]
+            # 新しいキーは末尾にあるため、最初の元のキーより後ろを順に最後尾へ移動する
+            first_idx = key_names.index(created[0][0]) + 1
+            sorted_names = key_names[first_idx:]
             wm = context.window_manager
-            wm.progress_begin(0, len(sorded_names))
-            for i, key in enumerate(sorded_names):
-                idx = key_blocks.find(key)
-                obj.active_shape_key_index = idx
+            wm.progress_begin(0, len(sorted_names))
+            for i, name in enumerate(sorted_names):
+                obj.active_shape_key_index = key_blocks.find(name)
                 bpy.ops.object.shape_key_move(type="BOTTOM")
                 wm.progress_update(i)
             wm.progress_end()
+            self.print("Moves: {}".format(len(sorted_names)))
 
         if self.remove_source:
             if self.mode == "ACTIVE":
@@ -258,14 +263,11 @@ class OBJECT_OT_mio3sk_generate_lr(Mio3SKOperator):
         self.print_time()
         return {"FINISHED"}
 
-    def create_shape_key(self, context, obj: Object, key_blocks, name):
+    def create_shape_keys(self, obj: Object, key_blocks, names):
+        """各キーから左右のシェイプキーを作成（Basisと左右のウェイトは1回だけ計算する）
+        (元のキー名, Lのキー名, Rのキー名) のリストを返す
+        """
         prop_o = obj.mio3sk
-        active_kb: ShapeKey = key_blocks[name]
-        active_ext = prop_o.ext_data.get(active_kb.name)
-
-        new_kb_l = obj.shape_key_add(name="{}{}".format(active_kb.name, "_L"), from_mix=False)
-        new_kb_r = obj.shape_key_add(name="{}{}".format(active_kb.name, "_R"), from_mix=False)
-
         basis_key = obj.data.shape_keys.reference_key
         v_len = len(obj.data.vertices)
 
@@ -273,51 +275,44 @@ class OBJECT_OT_mio3sk_generate_lr(Mio3SKOperator):
         basis_key.data.foreach_get("co", basis_co)
         basis_co = basis_co.reshape(-1, 3)
 
-        shape_co = np.empty(v_len * 3, dtype=np.float32)
-        active_kb.data.foreach_get("co", shape_co)
-        shape_co = shape_co.reshape(-1, 3)
+        weight_l, weight_r = calc_side_weights(basis_co[:, 0], self.smoothing_radius)
+        weight_l = weight_l[:, None]
+        weight_r = weight_r[:, None]
 
-        deform = shape_co - basis_co
-        radius = self.smoothing_radius
-        x = basis_co[:, 0]
-        if radius <= 0.0:
-            is_pos = x > np.float32(0.0)
-            is_neg = x < np.float32(0.0)
-            is_center = ~(is_pos | is_neg)
-            weight_l = is_pos.astype(np.float32) + is_center.astype(np.float32) * np.float32(0.5)
-            weight_r = is_neg.astype(np.float32) + is_center.astype(np.float32) * np.float32(0.5)
-        else:
-            radius_f = np.float32(radius)
-            t = (x + radius_f) / (np.float32(2.0) * radius_f)
-            t = np.clip(t, np.float32(0.0), np.float32(1.0))
-            t = t * t * (np.float32(3.0) - np.float32(2.0) * t)
-            weight_l = t
-            weight_r = np.float32(1.0) - weight_l
+        shape_co = np.empty((v_len, 3), dtype=np.float32)
+        created = []
+        for name in names:
+            source_kb: ShapeKey = key_blocks[name]
+            new_kb_l = obj.shape_key_add(name="{}{}".format(name, "_L"), from_mix=False)
+            new_kb_r = obj.shape_key_add(name="{}{}".format(name, "_R"), from_mix=False)
 
-        new_co_l = basis_co + deform * weight_l[:, None]
-        new_co_r = basis_co + deform * weight_r[:, None]
-        new_kb_l.data.foreach_set("co", new_co_l.ravel())
-        new_kb_r.data.foreach_set("co", new_co_r.ravel())
+            source_kb.data.foreach_get("co", shape_co.ravel())
+            deform = shape_co - basis_co
+            new_kb_l.data.foreach_set("co", (basis_co + deform * weight_l).ravel())
+            new_kb_r.data.foreach_set("co", (basis_co + deform * weight_r).ravel())
+            created.append((name, new_kb_l.name, new_kb_r.name))
 
-        add_ext_data(obj, {new_kb_l.name, new_kb_r.name})
+        add_ext_data(obj, {new_name for _, l_name, r_name in created for new_name in (l_name, r_name)})
 
-        ext_l = prop_o.ext_data.get(new_kb_l.name)
-        ext_r = prop_o.ext_data.get(new_kb_r.name)
-        if self.mode == "SELECTED":
-            ext_l["select"] = True
-            ext_r["select"] = True
+        for name, new_name_l, new_name_r in created:
+            source_ext = prop_o.ext_data.get(name)
+            ext_l = prop_o.ext_data.get(new_name_l)
+            ext_r = prop_o.ext_data.get(new_name_r)
+            if self.mode == "SELECTED":
+                ext_l["select"] = True
+                ext_r["select"] = True
 
-        copy_ext_info(active_ext, ext_l)
-        copy_ext_info(active_ext, ext_r)
+            copy_ext_info(source_ext, ext_l)
+            copy_ext_info(source_ext, ext_r)
 
-        if self.setup_rules:
-            if self.remove_source:
-                create_composer_rule(ext_r, "MIRROR", new_kb_l.name)
-            else:
-                create_composer_rule(ext_l, "+X", active_kb.name, smoothing_radius=self.smoothing_radius)
-                create_composer_rule(ext_r, "-X", active_kb.name, smoothing_radius=self.smoothing_radius)
+            if self.setup_rules:
+                if self.remove_source:
+                    create_composer_rule(ext_r, "MIRROR", new_name_l)
+                else:
+                    create_composer_rule(ext_l, "+X", name, smoothing_radius=self.smoothing_radius)
+                    create_composer_rule(ext_r, "-X", name, smoothing_radius=self.smoothing_radius)
 
-        return new_kb_l, new_kb_r
+        return created
 
 
 class OBJECT_OT_mio3sk_generate_opposite(Mio3SKOperator):
@@ -485,6 +480,15 @@ class OBJECT_OT_mio3sk_merge_lr(Mio3SKOperator):
     bl_description = "選択した_L、_Rシェイプキーを統合して新しいシェイプキーを作成します"
     bl_options = {"REGISTER", "UNDO"}
 
+    smoothing_radius: FloatProperty(
+        name="スムージング半径",
+        description="分割時と同じ半径を指定すると元のシェイプキーに戻ります",
+        default=0,
+        min=0.0,
+        step=0.1,
+        precision=3,
+    )
+
     @classmethod
     def poll(cls, context):
         obj = context.active_object
@@ -510,14 +514,21 @@ class OBJECT_OT_mio3sk_merge_lr(Mio3SKOperator):
             self.report({"WARNING"}, "統合可能なL/Rペアが見つかりません")
             return {"CANCELLED"}
 
-        created_pairs = []
-        for base_name, l_name, r_name in lr_pairs:
-            merged_kb = self.create_merged_shape_key(context, obj, key_blocks, base_name, l_name, r_name)
-            if merged_kb:
-                created_pairs.append((merged_kb.name, l_name, r_name))
-
-        for merged_name, l_name, r_name in created_pairs:
-            self.move_to_appropriate_position(obj, key_blocks, merged_name, l_name, r_name)
+        created_pairs = self.create_merged_shape_keys(obj, key_blocks, lr_pairs, self.smoothing_radius)
+        if created_pairs:
+            # 統合したキーをL/Rのうち上にあるキーの直前に配置
+            insert_before = {}
+            for merged_name, l_name, r_name in created_pairs:
+                anchor = min(l_name, r_name, key=key_blocks.find)
+                insert_before.setdefault(anchor, []).append(merged_name)
+            merged_names = {merged_name for merged_name, _, _ in created_pairs}
+            sorted_names = []
+            for name in key_blocks.keys()[1:]:
+                if name in merged_names:
+                    continue
+                sorted_names.extend(insert_before.get(name, []))
+                sorted_names.append(name)
+            reorder_shape_keys(obj, sorted_names)
 
         refresh_data(context, obj, check=True, group=True, filter=True)
         self.print_time()
@@ -570,16 +581,11 @@ class OBJECT_OT_mio3sk_merge_lr(Mio3SKOperator):
 
         return lr_pairs
 
-    def create_merged_shape_key(self, context, obj: Object, key_blocks, base_name, l_name, r_name):
-        """L/Rシェイプキーから統合シェイプキーを作成"""
-        l_kb = key_blocks.get(l_name)
-        r_kb = key_blocks.get(r_name)
-
-        if not l_kb or not r_kb:
-            return None
-
-        merged_kb = obj.shape_key_add(name=base_name, from_mix=False)
-
+    @staticmethod
+    def create_merged_shape_keys(obj: Object, key_blocks, lr_pairs, smoothing_radius=0.0):
+        """L/Rシェイプキーから統合シェイプキーを作成
+        分割と同じ半径で、片側の影響がある範囲の差分だけを合計する（分割したキーは元に戻る）
+        """
         basis_key = obj.data.shape_keys.reference_key
         v_len = len(obj.data.vertices)
 
@@ -587,45 +593,32 @@ class OBJECT_OT_mio3sk_merge_lr(Mio3SKOperator):
         basis_key.data.foreach_get("co", basis_co)
         basis_co = basis_co.reshape(-1, 3)
 
-        l_co = np.empty(v_len * 3, dtype=np.float32)
-        l_kb.data.foreach_get("co", l_co)
-        l_co = l_co.reshape(-1, 3)
-
-        r_co = np.empty(v_len * 3, dtype=np.float32)
-        r_kb.data.foreach_get("co", r_co)
-        r_co = r_co.reshape(-1, 3)
-
-        merged_co = basis_co.copy()
-        for i in range(v_len):
-            x = basis_co[i, 0]
-            if x > 0:
-                merged_co[i] = l_co[i]
-            elif x < 0:
-                merged_co[i] = r_co[i]
-            else:
-                l_delta = l_co[i] - basis_co[i]
-                r_delta = r_co[i] - basis_co[i]
-                merged_co[i] = basis_co[i] + (l_delta + r_delta)
-
-        merged_kb.data.foreach_set("co", merged_co.ravel())
+        weight_l, weight_r = calc_side_weights(basis_co[:, 0], smoothing_radius)
+        side_l = (weight_l > 0.0)[:, None]
+        side_r = (weight_r > 0.0)[:, None]
 
-        l_kb.value = 0.0
-        r_kb.value = 0.0
-
-        add_ext_data(obj, {base_name})
+        l_co = np.empty((v_len, 3), dtype=np.float32)
+        r_co = np.empty((v_len, 3), dtype=np.float32)
+        created_pairs = []
+        for base_name, l_name, r_name in lr_pairs:
+            l_kb = key_blocks.get(l_name)
+            r_kb = key_blocks.get(r_name)
+            if not l_kb or not r_kb:
+                continue
 
-        return merged_kb
+            l_kb.data.foreach_get("co", l_co.ravel())
+            r_kb.data.foreach_get("co", r_co.ravel())
+            merged_co = basis_co + np.where(side_l, l_co - basis_co, 0.0) + np.where(side_r, r_co - basis_co, 0.0)
 
-    def move_to_appropriate_position(self, obj, key_blocks, merged_name, l_name, r_name):
-        """統合シェイプキーを移動"""
-        merged_idx = key_blocks.find(merged_name)
-        if merged_idx == -1:
-            return
+            merged_kb = obj.shape_key_add(name=base_name, from_mix=False)
+            merged_kb.data.foreach_set("co", merged_co.astype(np.float32).ravel())
 
-        target_idx = min([idx for idx in [key_blocks.find(l_name), key_blocks.find(r_name)] if idx != -1])
+            l_kb.value = 0.0
+            r_kb.value = 0.0
+            created_pairs.append((merged_kb.name, l_name, r_name))
 
-        if target_idx != -1:
-            move_shape_key_below(obj, target_idx - 1, merged_idx)
+        add_ext_data(obj, {merged_name for merged_name, _, _ in created_pairs})
+        return created_pairs
 
 
 classes = [
@@ -2,7 +2,7 @@ import bpy
 import json
 from bpy.props import StringProperty, EnumProperty
 from ..classes.operator import Mio3SKOperator, Mio3SKGlobalOperator
-from ..utils.ext_data import clear_filter, refresh_data
+from ..utils.ext_data import clear_filter, refresh_data, invalidate_group_cache
 from ..utils.utils import has_shape_key, valid_shape_key, is_sync_collection
 
 
@@ -82,6 +82,7 @@ class OBJECT_OT_mio3sk_refresh_ext_data(Mio3SKGlobalOperator):
                         item = prop_o.ext_data.add()
                         item.name = name
 
+                invalidate_group_cache(obj)
                 refresh_data(context, obj, group=True, composer=True, tag=True, filter=True)
 
         for area in context.screen.areas:
@@ -126,6 +127,7 @@ class OBJECT_OT_mio3sk_clear_ext_data(Mio3SKGlobalOperator):
         prop_o.tag_list.clear()
         prop_o.preset_list.clear()
         prop_o.syncs = None
+        invalidate_group_cache(obj)
 
         refresh_data(context, obj, check=True, composer=True, filter=True)
 
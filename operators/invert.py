@@ -2,6 +2,7 @@ import bpy
 import numpy as np
 from ..classes.operator import Mio3SKOperator
 from ..utils.utils import is_local_obj, valid_shape_key
+from ..utils.key_stats import invalidate_key_stats
 
 
 class OBJECT_OT_mio3sk_invert(Mio3SKOperator):
@@ -42,6 +43,7 @@ class OBJECT_OT_mio3sk_invert(Mio3SKOperator):
             diff = shape_co_flat - basis_co_flat
             result_co = basis_co_flat - diff
             active_kb.data.foreach_set("co", result_co)
+            invalidate_key_stats(obj, [active_kb.name])
             obj.data.update()
         else:
             try:
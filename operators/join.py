@@ -5,6 +5,7 @@ from bpy.props import BoolProperty, EnumProperty
 from ..classes.operator import Mio3SKOperator
 from ..utils.utils import is_local_obj, valid_shape_key, get_unique_name
 from ..utils.ext_data import clear_filter, refresh_data
+from ..utils.key_stats import invalidate_key_stats
 
 # shape_key_transfer_op = bpy.ops.object.shape_key_transfer.get_rna_type()
 # join_shapes_op = bpy.ops.object.join_shapes.get_rna_type()
@@ -75,6 +76,7 @@ class OBJECT_OT_mio3sk_join_keys(Mio3SKOperator):
                 bm.free()
             else:
                 active_kb.data.foreach_set("co", shape_co_flat)
+                invalidate_key_stats(obj, [active_kb.name])
 
             bas_co_flat = np.empty(v_len * 3, dtype=np.float32)
             basis_kb.data.foreach_get("co", bas_co_flat)
@@ -3,6 +3,7 @@ import numpy as np
 from mathutils import Vector, kdtree
 from ..classes.operator import Mio3SKOperator
 from ..utils.utils import is_local_obj, valid_shape_key
+from ..utils.key_stats import invalidate_key_stats
 
 
 class MESH_OT_mio3sk_mirror(Mio3SKOperator):
@@ -65,6 +66,7 @@ class MESH_OT_mio3sk_mirror(Mio3SKOperator):
             result_co[valid_indices] += mirror_deform
 
         target_kb.data.foreach_set("co", result_co.ravel())
+        invalidate_key_stats(obj, [target_kb.name])
         obj.data.update()
 
         self.print_time()
@@ -1,7 +1,7 @@
 import bpy
 from bpy.props import EnumProperty, IntProperty
 from ..classes.operator import Mio3SKOperator
-from ..utils.utils import is_local_obj, valid_shape_key, move_shape_key_below, clear_shape_keys_selection
+from ..utils.utils import is_local_obj, valid_shape_key, move_shape_key_below, clear_shape_keys_selection, reorder_shape_keys
 from ..utils.ext_data import refresh_data, get_key_groups
 
 
@@ -85,15 +85,12 @@ class OBJECT_OT_mio3sk_move_below(Mio3SKOperator):
             move_idx = key_blocks.find(selected_names[0])
             move_shape_key_below(obj, anchor_idx, move_idx)
         else:
-            clear_shape_keys_selection(key_blocks)
-
-            remaining = [name for name in key_blocks.keys() if name not in selected_names]
-            active_index = remaining.index(active_kb.name)
-            sorted_names = remaining[active_index:1] + selected_names + remaining[active_index + 1 :]
-            for i, key in enumerate(sorted_names):
-                idx = key_blocks.find(key)
-                obj.active_shape_key_index = idx
-                bpy.ops.object.shape_key_move(type="BOTTOM")
+            selected_set = set(selected_names)
+            remaining = [name for name in key_blocks.keys()[1:] if name not in selected_set]
+            active_index = remaining.index(active_kb.name) + 1 if active_kb.name in remaining else 0
+            sorted_names = remaining[:active_index] + selected_names + remaining[active_index:]
+            moves = reorder_shape_keys(obj, sorted_names)
+            self.print("Moves: {}".format(moves))
 
         obj.active_shape_key_index = key_blocks.find(active_kb.name)
         refresh_data(context, obj, check=True, group=True, filter=True)
@@ -123,9 +120,10 @@ class OBJECT_OT_mio3sk_move_group(Mio3SKOperator):
         if len(groups) < 2:
             return {"CANCELLED"}
 
+        ungrouped = []
         ext = prop_o.ext_data.get(groups[0][0].name)
         if not ext or not ext.is_group:
-            groups.pop(0)  # 未分類を除外
+            ungrouped = groups.pop(0)  # 未分類を除外
 
         a_idx = next((i for i, group in enumerate(groups) if active_kb in group), -1)
         if a_idx == -1:
@@ -133,26 +131,17 @@ class OBJECT_OT_mio3sk_move_group(Mio3SKOperator):
 
         if self.type == "UP" and a_idx > 0:
             groups[a_idx - 1], groups[a_idx] = groups[a_idx], groups[a_idx - 1]
-            sorted_names = [k.name for group in groups[a_idx:] for k in group]
         elif self.type == "DOWN" and a_idx < len(groups) - 1:
             groups[a_idx], groups[a_idx + 1] = groups[a_idx + 1], groups[a_idx]
-            sorted_names = [k.name for group in groups[a_idx + 1 :] for k in group]
         else:
             return {"CANCELLED"}
 
-        current_key_name = obj.active_shape_key.name
+        sorted_names = [k.name for k in ungrouped] + [k.name for group in groups for k in group]
 
-        clear_shape_keys_selection(key_blocks)
-
-        wm = context.window_manager
-        wm.progress_begin(0, len(sorted_names))
-        for i, key in enumerate(sorted_names):
-            idx = key_blocks.find(key)
-            obj.active_shape_key_index = idx
-            bpy.ops.object.shape_key_move(type="BOTTOM")
-            wm.progress_update(i)
-        wm.progress_end()
+        current_key_name = obj.active_shape_key.name
+        moves = reorder_shape_keys(obj, sorted_names)
         obj.active_shape_key_index = key_blocks.find(current_key_name)
+        self.print("Moves: {}".format(moves))
 
         refresh_data(context, obj, check=True, group=True, filter=True)
         return {"FINISHED"}
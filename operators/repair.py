@@ -3,6 +3,7 @@ import numpy as np
 from bpy.types import ShapeKey
 from bpy.props import BoolProperty, FloatProperty, StringProperty
 from ..classes.operator import Mio3SKOperator
+from ..utils.key_stats import invalidate_key_stats
 
 
 class MESH_OT_mio3sk_repair(Mio3SKOperator):
@@ -34,6 +35,7 @@ class MESH_OT_mio3sk_repair(Mio3SKOperator):
             return {"FINISHED"}
 
         self.repair(basis_kb, source_kb, active_kb, self.blend, self.moved_only)
+        invalidate_key_stats(obj, [active_kb.name])
         obj.data.update()
 
         self.print_time()
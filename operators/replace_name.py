@@ -3,7 +3,7 @@ import bpy
 from bpy.props import BoolProperty, IntProperty, StringProperty
 from ..utils.utils import has_shape_key, is_local_obj, valid_shape_key, is_sync_collection
 from ..classes.operator import Mio3SKOperator
-from ..utils.ext_data import rename_ext_data, refresh_data
+from ..utils.ext_data import rename_ext_data_batch, refresh_store_names, refresh_data
 
 
 class OBJECT_OT_mio3sk_replace(Mio3SKOperator):
@@ -77,14 +77,18 @@ class OBJECT_OT_mio3sk_replace(Mio3SKOperator):
         prop_w.operator_objects.clear()
         for ob in target_objects:
             key_blocks = ob.data.shape_keys.key_blocks
+            rename_map = {}
             for key in key_blocks[1:]:
-                new_name = self.rep_name(key.name, rename_search, rename_replace, self.use_regex)
-                if key.name != new_name and new_name not in key_blocks:
+                old_name = key.name
+                new_name = self.rep_name(old_name, rename_search, rename_replace, self.use_regex)
+                if old_name != new_name and new_name not in key_blocks:
                     key.name = new_name
-                    rename_ext_data(context, ob, key.name, new_name)
+                    rename_map[old_name] = new_name
                 else:
-                    if key.name != new_name:
-                        self.report({"INFO"}, "Skip: '{}' in '{}' (conflict)".format(key.name, ob.name))
+                    if old_name != new_name:
+                        self.report({"INFO"}, "Skip: '{}' in '{}' (conflict)".format(old_name, ob.name))
+            rename_ext_data_batch(context, ob, rename_map)
+            refresh_store_names(ob, key_blocks.keys())  # 反映済みのため check_update で再適用しない
             refresh_data(context, ob, check=True, group=True, filter=True)
             prop_w.operator_objects.add().obj = ob
         return {"FINISHED"}
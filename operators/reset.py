@@ -3,6 +3,7 @@ import numpy as np
 from bpy.app.translations import pgettext_iface as tt_iface
 from ..classes.operator import Mio3SKOperator
 from ..utils.utils import is_local_obj, has_shape_key
+from ..utils.key_stats import invalidate_key_stats
 
 
 class MESH_OT_mio3sk_reset(Mio3SKOperator):
@@ -52,6 +53,7 @@ class MESH_OT_mio3sk_reset(Mio3SKOperator):
                 basis_co_flat = np.empty(len(obj.data.vertices) * 3, dtype=np.float32)
                 obj.data.vertices.foreach_get("co", basis_co_flat)
                 active_kb.data.foreach_set("co", basis_co_flat)
+                invalidate_key_stats(obj, [active_kb.name])
                 obj.data.update()
             else:
                 self.report({"ERROR"}, "Active Shape Key is Locked")
@@ -108,6 +110,7 @@ class OBJECT_OT_mio3sk_reset(Mio3SKOperator):
                 if kb.name not in selected_names or kb.lock_shape:
                     continue
                 kb.data.foreach_set("co", basis_co_flat)
+            invalidate_key_stats(obj, selected_names)
             obj.data.update()
 
         self.print_time()
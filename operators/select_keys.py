@@ -1,11 +1,12 @@
 import bpy
-import bmesh
 import numpy as np
-from mathutils import kdtree
-from bpy.props import BoolProperty, FloatProperty, StringProperty
+from bpy.props import BoolProperty, EnumProperty, FloatProperty, StringProperty
 from ..classes.operator import Mio3SKOperator
-from ..utils.utils import is_local_obj, has_shape_key
-from ..utils.ext_data import refresh_filter_flag, refresh_ui_select, clear_filter
+from ..utils.utils import is_local_obj, has_shape_key, reorder_shape_keys
+from ..utils.ext_data import refresh_data, refresh_filter_flag, refresh_ui_select, clear_filter
+from ..utils.key_stats import get_key_stats, invalidate_key_stats, find_moved_keys, calc_asymmetry_scores, find_duplicate_keys
+from ..utils.merge_check import get_merge_stages, classify_merge_keys
+from ..utils.mesh import X_MIRROR_TOLERANCE
 
 
 class MIO3SKSelectKeysBase(Mio3SKOperator):
@@ -45,26 +46,11 @@ class OBJECT_OT_mio3sk_select_all_unused(MIO3SKSelectKeysBase):
     def execute(self, context):
         self.start_time()
         obj = context.active_object
-        me = obj.data
-        key_blocks = obj.data.shape_keys.key_blocks
-        basis_kb = obj.data.shape_keys.reference_key
 
         clear_filter(context, obj)
 
-        v_len = len(me.vertices)
-
-        basis_co_flat = np.empty(v_len * 3, dtype=np.float32)
-        basis_kb.data.foreach_get("co", basis_co_flat)
-        basis_co = basis_co_flat.reshape(-1, 3)
-
-        select_keys = set()
-        for kb in key_blocks[1:]:
-            shape_co_flat = np.empty(v_len * 3, dtype=np.float32)
-            kb.data.foreach_get("co", shape_co_flat)
-            shape_co = shape_co_flat.reshape(-1, 3)
-            if np.any(np.abs(basis_co - shape_co) > self.threshold):
-                continue
-            select_keys.add(kb.name)
+        key_stats = get_key_stats(obj)
+        select_keys = {name for name, stats in key_stats.items() if stats["max_abs"] <= self.threshold}
 
         for ext in obj.mio3sk.ext_data:
             ext["select"] = ext.name in select_keys
@@ -118,25 +104,13 @@ class OBJECT_OT_mio3sk_select_all_by_verts(MIO3SKSelectKeysBase):
 
         clear_filter(context, obj)
 
-        bm = bmesh.from_edit_mesh(obj.data)
-        bm.verts.ensure_lookup_table()
-
-        selected_vert_indices = [v.index for v in bm.verts if v.select]
-        basis_layer = bm.verts.layers.shape.get(obj.data.shape_keys.reference_key.name)
+        obj.update_from_editmode()
+        vertices = obj.data.vertices
+        selected_mask = np.zeros(len(vertices), dtype=bool)
+        vertices.foreach_get("select", selected_mask)
+        selected_vert_indices = np.flatnonzero(selected_mask)
 
-        select_keys = set()
-        for kb in key_blocks[1:]:
-            shape_layer = bm.verts.layers.shape.get(kb.name)
-            for vert_idx in selected_vert_indices:
-                v = bm.verts[vert_idx]
-                basis_co = v[basis_layer]
-                shape_co = v[shape_layer]
-                delta = (basis_co - shape_co).length
-                if delta > self.threshold:
-                    select_keys.add(kb.name)
-                    break
-
-        bm.free()
+        select_keys = find_moved_keys(obj, key_blocks.keys()[1:], selected_vert_indices, self.threshold)
 
         for ext in obj.mio3sk.ext_data:
             ext["select"] = ext.name in select_keys
@@ -187,45 +161,9 @@ class OBJECT_OT_mio3sk_select_all_asymmetry(MIO3SKSelectKeysBase):
         self.start_time()
         obj = context.active_object
         key_blocks = obj.data.shape_keys.key_blocks
-        basis_kb = obj.data.shape_keys.reference_key
 
         clear_filter(context, obj)
 
-        v_len = len(obj.data.vertices)
-
-        visible_verts = None
-        if self.exclude_hide:
-            visible_verts = np.array([v.index for v in obj.data.vertices if not v.hide], dtype=np.int32)
-            if len(visible_verts) == 0:
-                return {"CANCELLED"}
-
-        basis_co_flat = np.empty(v_len * 3, dtype=np.float32)
-        basis_kb.data.foreach_get("co", basis_co_flat)
-        basis_co = basis_co_flat.reshape(-1, 3)
-
-        kd = kdtree.KDTree(v_len)
-        for i, co in enumerate(basis_co):
-            if self.exclude_hide and i not in visible_verts:
-                continue
-            mirror_co = (-co[0], co[1], co[2])
-            kd.insert(mirror_co, i)
-        kd.balance()
-
-        threshold = self.threshold
-        mirror_indices = np.full(v_len, -1, dtype=np.int32)
-        pair_indices = []
-
-        for i, co in enumerate(basis_co):
-            if self.exclude_hide and i not in visible_verts:
-                continue
-            co_find = kd.find(co)
-            if co_find[2] < threshold:
-                mirror_indices[i] = co_find[1]
-                pair_indices.append(i)
-
-        pair_indices = np.array(pair_indices, dtype=np.int32)
-        valid_mirror_indices = mirror_indices[pair_indices]
-
         suffix_set = set(self.exclude_suffix)
         candidate_keys = []
         if self.exclude_asymmetry_names:
@@ -233,19 +171,20 @@ class OBJECT_OT_mio3sk_select_all_asymmetry(MIO3SKSelectKeysBase):
         else:
             candidate_keys = key_blocks[1:]
 
-        select_keys = set()
-        for kb in candidate_keys:
-            shape_co_flat = np.empty(v_len * 3, dtype=np.float32)
-            kb.data.foreach_get("co", shape_co_flat)
-            shape_co = shape_co_flat.reshape(-1, 3)
-            deformation = shape_co - basis_co
-            left_deform = deformation[pair_indices]
-            right_deform = deformation[valid_mirror_indices]
-            right_deform[:, 0] *= -1
-            diff = np.abs(left_deform - right_deform)
-            is_asymmetric = np.any(diff > threshold)
-            if is_asymmetric:
-                select_keys.add(kb.name)
+        candidate_names = [kb.name for kb in candidate_keys]
+        if self.exclude_hide:
+            vertices = obj.data.vertices
+            visible_mask = np.zeros(len(vertices), dtype=bool)
+            vertices.foreach_get("hide", visible_mask)
+            np.logical_not(visible_mask, out=visible_mask)
+            if not visible_mask.any():
+                return {"CANCELLED"}
+            scores = calc_asymmetry_scores(obj, candidate_names, self.threshold, visible_mask)
+        else:
+            key_stats = get_key_stats(obj, candidate_names, mirror_tolerance=self.threshold)
+            scores = {name: stats["sym_error"] for name, stats in key_stats.items()}
+
+        select_keys = {name for name, score in scores.items() if score > self.threshold}
 
         for ext in obj.mio3sk.ext_data:
             ext["select"] = ext.name in select_keys
@@ -331,6 +270,68 @@ class OBJECT_OT_mio3sk_select_group_toggle(MIO3SKSelectKeysBase):
         return {"FINISHED"}
 
 
+class OBJECT_OT_mio3sk_select_all_duplicate(MIO3SKSelectKeysBase):
+    bl_idname = "object.mio3sk_select_all_duplicate"
+    bl_label = "重複しているキーを選択"
+    bl_description = "形状がほぼ同じシェイプキーを選択します"
+    bl_options = {"REGISTER", "UNDO"}
+
+    threshold: FloatProperty(
+        name="Threshold",
+        default=0.0001,
+        min=0.0,
+        step=0.01,
+        precision=4,
+        # unit="LENGTH",
+    )
+    mode: EnumProperty(
+        name="Mode",
+        items=[
+            ("DUPLICATE", "先頭以外", "各グループの最初のキー以外を選択"),
+            ("ALL", "すべて", "重複しているキーをすべて選択"),
+        ],
+    )
+    gather: BoolProperty(name="重複キーを並べる", description="重複しているキーを最初のキーの下に移動します", default=False)
+
+    def execute(self, context):
+        self.start_time()
+        obj = context.active_object
+        key_blocks = obj.data.shape_keys.key_blocks
+
+        clear_filter(context, obj)
+
+        key_names = key_blocks.keys()[1:]
+        groups = find_duplicate_keys(obj, key_names, self.threshold)
+        for group in groups:
+            self.print(" = ".join(group))
+
+        if self.mode == "ALL":
+            select_keys = {name for group in groups for name in group}
+        else:
+            select_keys = {name for group in groups for name in group[1:]}
+
+        if self.gather and groups:
+            group_map = {group[0]: group[1:] for group in groups}
+            members = {name for group in groups for name in group[1:]}
+            sorted_names = []
+            for name in key_names:
+                if name not in members:
+                    sorted_names.append(name)
+                    sorted_names.extend(group_map.get(name, []))
+            current_key_name = obj.active_shape_key.name
+            reorder_shape_keys(obj, sorted_names)
+            obj.active_shape_key_index = key_blocks.find(current_key_name)
+            refresh_data(context, obj, check=True, group=True)
+
+        for ext in obj.mio3sk.ext_data:
+            ext["select"] = ext.name in select_keys
+
+        refresh_filter_flag(context, obj)
+        self.report({"INFO"}, "{} groups".format(len(groups)))
+        self.print_time()
+        return {"FINISHED"}
+
+
 class OBJECT_OT_mio3sk_select_all_error(MIO3SKSelectKeysBase):
     bl_idname = "object.mio3sk_select_all_error"
     bl_label = "エラー要因になるキーを選択"
@@ -349,11 +350,21 @@ class OBJECT_OT_mio3sk_select_all_error(MIO3SKSelectKeysBase):
         key_blocks.foreach_set("value", [0.0] * len(key_blocks))
         key_blocks.foreach_set("mute", [False] * len(key_blocks))
 
+        # マージ距離との比較で判定できないキーだけモディファイアを評価する
+        key_names = key_blocks.keys()[1:]
+        stages = get_merge_stages(obj)
+        if stages is None:
+            select_keys, eval_keys = set(), set(key_names)
+        else:
+            select_keys, eval_keys = classify_merge_keys(obj, key_names, stages)
+        self.print("Evaluate {} / {} keys".format(len(eval_keys), len(key_names)))
+
         depsgraph = context.evaluated_depsgraph_get()
         base_vcount = len(obj.evaluated_get(depsgraph).data.vertices)
 
-        select_keys = set()
         for kb in key_blocks[1:]:
+            if kb.name not in eval_keys:
+                continue
             kb.value = 1.0
             depsgraph.update()
             if base_vcount != len(obj.evaluated_get(depsgraph).data.vertices):
@@ -369,6 +380,23 @@ class OBJECT_OT_mio3sk_select_all_error(MIO3SKSelectKeysBase):
         return {"FINISHED"}
 
 
+class OBJECT_OT_mio3sk_refresh_key_stats(MIO3SKSelectKeysBase):
+    bl_idname = "object.mio3sk_refresh_key_stats"
+    bl_label = "移動量の統計を更新"
+    bl_description = "シェイプキーごとの移動量の統計を計算します（変更されたキーのみ再計算）"
+    bl_options = {"REGISTER"}
+
+    def execute(self, context):
+        self.start_time()
+        obj = context.active_object
+        if obj.mode == "EDIT":
+            obj.update_from_editmode()
+            invalidate_key_stats(obj, [obj.active_shape_key.name])
+        get_key_stats(obj, mirror_tolerance=X_MIRROR_TOLERANCE)
+        self.print_time()
+        return {"FINISHED"}
+
+
 class OBJECT_OT_mio3sk_select_invert(MIO3SKSelectKeysBase):
     bl_idname = "object.mio3sk_select_invert"
     bl_label = "選択を反転"
@@ -390,10 +418,12 @@ classes = [
     OBJECT_OT_mio3sk_select_all_unused,
     OBJECT_OT_mio3sk_select_all_by_verts,
     OBJECT_OT_mio3sk_select_all_asymmetry,
+    OBJECT_OT_mio3sk_select_all_duplicate,
     OBJECT_OT_mio3sk_select_all,
     OBJECT_OT_mio3sk_deselect_all,
     OBJECT_OT_mio3sk_select_group_toggle,
     OBJECT_OT_mio3sk_select_all_error,
+    OBJECT_OT_mio3sk_refresh_key_stats,
     OBJECT_OT_mio3sk_select_invert,
 ]
 
@@ -1,8 +1,9 @@
 import bpy
-import bmesh
-from mathutils import Vector, kdtree
+import numpy as np
 from bpy.props import BoolProperty, FloatProperty
 from ..utils.utils import is_local_obj, valid_shape_key
+from ..utils.mesh import select_verts_by_mask
+from ..utils.key_stats import build_x_mirror_pairs
 from ..classes.operator import Mio3SKOperator
 
 
@@ -48,34 +49,17 @@ class MESH_OT_mio3sk_select_moved(Mio3SKOperator):
         self.start_time()
 
         obj = context.active_object
-        active_key = obj.active_shape_key
-        basis_kb = obj.data.shape_keys.reference_key
         context.tool_settings.mesh_select_mode = (True, False, False)
 
-        bm = bmesh.from_edit_mesh(obj.data)
-        bm.verts.ensure_lookup_table()
-
-        basis_layer = bm.verts.layers.shape.get(basis_kb.name)
-        active_layer = bm.verts.layers.shape.get(active_key.name)
+        basis_co, active_co = read_edit_shape_co(obj)
+        delta = active_co - basis_co
+        moved = np.einsum("ij,ij->i", delta, delta) > self.threshold * self.threshold
 
-        threshold = self.threshold
         if self.invert:
-            for v in bm.verts:
-                delta = (v[basis_layer] - v[active_layer]).length
-                v.select = not delta > threshold
+            select_verts_by_mask(obj, ~moved)
         else:
-            if self.add:
-                for v in bm.verts:
-                    delta = (v[basis_layer] - v[active_layer]).length
-                    if delta > threshold:
-                        v.select = True
-            else:
-                for v in bm.verts:
-                    delta = (v[basis_layer] - v[active_layer]).length
-                    v.select = delta > threshold
-
-        bm.select_flush_mode()
-        bmesh.update_edit_mesh(obj.data)
+            select_verts_by_mask(obj, moved, add=self.add)
+
         self.print_time()
         return {"FINISHED"}
 
@@ -107,72 +91,37 @@ class MESH_OT_mio3sk_select_asymmetry(Mio3SKOperator):
     def execute(self, context):
         self.start_time()
         obj = context.active_object
-        active_key = obj.active_shape_key
         context.tool_settings.mesh_select_mode = (True, False, False)
 
-        bm = bmesh.from_edit_mesh(obj.data)
-        bm.verts.ensure_lookup_table()
-
-        basis_layer = bm.verts.layers.shape.get("Basis")
-        active_layer = bm.verts.layers.shape.get(active_key.name)
-        threshold_squared = self.threshold * self.threshold
-
-        basis_co = []
-        basis_kd = kdtree.KDTree(len(bm.verts))
-        for i, v in enumerate(bm.verts):
-            co = v[basis_layer]
-            basis_co.append(co)
-            basis_kd.insert(co, i)
-        basis_kd.balance()
-
-        mirror_co = Vector()
-        vert_pairs = {}
-        basis_asymmetric = set()
-        processed = set()
-
-        for i, (v, co) in enumerate(zip(bm.verts, basis_co)):
-            if i in processed:
-                continue
-
-            mirror_co.x = -co.x
-            mirror_co.y = co.y
-            mirror_co.z = co.z
-
-            closest = basis_kd.find(mirror_co)
-            if (mirror_co - closest[0]).length_squared <= threshold_squared:
-                pair_idx = closest[1]
-                vert_pairs[i] = pair_idx
-                vert_pairs[pair_idx] = i
-                processed.add(i)
-                processed.add(pair_idx)
-            else:
-                basis_asymmetric.add(i)
-
-        for v in bm.verts:
-            v.select = False
+        basis_co, active_co = read_edit_shape_co(obj)
+        pair_indices, mirror_indices = build_x_mirror_pairs(basis_co, self.threshold)
 
+        mask = np.zeros(len(basis_co), dtype=bool)
         if self.include_basis:
-            for v_idx in basis_asymmetric:
-                bm.verts[v_idx].select = True
-
-        for v_idx, mirror_idx in vert_pairs.items():
-            v1_co = bm.verts[v_idx][active_layer]
-            v2_co = bm.verts[mirror_idx][active_layer]
+            mask[:] = True
+            mask[pair_indices] = False
 
-            mirror_co.x = -v2_co.x
-            mirror_co.y = v2_co.y
-            mirror_co.z = v2_co.z
+        diff = active_co[pair_indices] - active_co[mirror_indices] * (-1.0, 1.0, 1.0)
+        asymmetric = np.einsum("ij,ij->i", diff, diff) > self.threshold * self.threshold
+        mask[pair_indices[asymmetric]] = True
+        mask[mirror_indices[asymmetric]] = True
 
-            if (v1_co - mirror_co).length_squared > threshold_squared:
-                bm.verts[v_idx].select = True
-                bm.verts[mirror_idx].select = True
-
-        bm.select_flush_mode()
-        bmesh.update_edit_mesh(obj.data)
+        select_verts_by_mask(obj, mask)
         self.print_time()
         return {"FINISHED"}
 
 
+def read_edit_shape_co(obj):
+    """編集中の Basis とアクティブキーの座標を取得"""
+    obj.update_from_editmode()
+    v_len = len(obj.data.vertices)
+    basis_co = np.empty(v_len * 3, dtype=np.float32)
+    active_co = np.empty(v_len * 3, dtype=np.float32)
+    obj.data.shape_keys.reference_key.data.foreach_get("co", basis_co)
+    obj.active_shape_key.data.foreach_get("co", active_co)
+    return basis_co.reshape(-1, 3), active_co.reshape(-1, 3)
+
+
 classes = [MESH_OT_mio3sk_select_moved, MESH_OT_mio3sk_select_asymmetry]
 
 
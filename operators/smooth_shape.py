@@ -1,10 +1,11 @@
 import bpy
 import bmesh
-from mathutils import Vector
-from bpy.props import FloatProperty, EnumProperty
+import numpy as np
+from bpy.props import BoolProperty, FloatProperty, EnumProperty
 from ..classes.operator import Mio3SKOperator
-from ..utils.mesh import find_x_mirror_verts
+from ..utils.mesh import mirror_mask_x
 from ..utils.utils import valid_shape_key
+from ..utils.smooth import get_mesh_edges, get_smooth_operator, smooth_field
 
 
 class MESH_OT_mio3sk_smooth_shape(Mio3SKOperator):
@@ -24,6 +25,16 @@ class MESH_OT_mio3sk_smooth_shape(Mio3SKOperator):
         items=[("1", "1", ""), ("3", "3", ""), ("5", "5", ""), ("10", "10", ""), ("20", "20", "")],
     )
     anti_bump: FloatProperty(name="凸凹補正", default=0.5, min=0, max=1, step=5)
+    method: EnumProperty(
+        name="Method",
+        items=[
+            ("UNIFORM", "Laplacian", "隣接頂点の平均"),
+            ("TAUBIN", "Taubin", "縮みを抑えるλ/μスムーズ"),
+            ("COTANGENT", "Cotangent", "面の形状で重み付けした平均"),
+        ],
+    )
+    use_convergence: BoolProperty(name="収束で停止", description="移動量が許容値を下回ったら繰り返しを止めます", default=False)
+    tolerance: FloatProperty(name="許容値", default=0.00001, min=0.0, step=0.001, precision=6)
 
     def execute(self, context):
         self.start_time()
@@ -31,24 +42,55 @@ class MESH_OT_mio3sk_smooth_shape(Mio3SKOperator):
 
         bm = bmesh.from_edit_mesh(obj.data)
         bm.verts.ensure_lookup_table()
-        bm.faces.ensure_lookup_table()
 
-        selected_verts = {v for v in bm.verts if v.select}
-        if obj.use_mesh_mirror_x:
-            selected_verts.update(find_x_mirror_verts(bm, selected_verts))
+        obj.update_from_editmode()
+        v_len = len(obj.data.vertices)
+        selected_mask = np.zeros(v_len, dtype=bool)
+        obj.data.vertices.foreach_get("select", selected_mask)
 
         basis_kb = obj.data.shape_keys.reference_key
-        if not obj.data.shape_keys or basis_kb == obj.active_shape_key:
-            self.mode = "LAPLACIAN"
-            self.smooth_laplacian(obj, bm)
+        active_kb = obj.active_shape_key
+        self.mode = "LAPLACIAN" if basis_kb == active_kb else "SHAPE_KEY"
+
+        if self.mode == "SHAPE_KEY" and obj.use_mesh_mirror_x:
+            selected_mask = mirror_mask_x(obj, selected_mask)
+
+        indices = np.flatnonzero(selected_mask)
+        if not len(indices):
+            return {"CANCELLED"}
+
+        active_co = np.empty(v_len * 3, dtype=np.float32)
+        active_kb.data.foreach_get("co", active_co)
+        active_co = active_co.reshape(-1, 3).astype(np.float64)
+        basis_co = np.empty(v_len * 3, dtype=np.float32)
+        basis_kb.data.foreach_get("co", basis_co)
+        basis_co = basis_co.reshape(-1, 3).astype(np.float64)
+
+        kind = "COTANGENT" if self.method == "COTANGENT" else "UNIFORM"
+        operator = get_smooth_operator(obj, get_mesh_edges(obj), kind, basis_co)
+        options = {
+            "taubin": self.method == "TAUBIN",
+            "tolerance": self.tolerance if self.use_convergence else 0.0,
+        }
+
+        if self.mode == "LAPLACIAN":
+            factors = np.full(len(indices), self.blend)
+            new_co, count = smooth_field(active_co, operator, indices, factors, int(self.iterations), **options)
         else:
-            self.mode = "SHAPE_KEY"
-            active_kb = obj.active_shape_key
+            delta = active_co - basis_co
+
+            # 凸凹補正
+            offsets = np.linalg.norm(delta[indices], axis=1)
+            max_offset = max(offsets.max(), 0.000001)
+            factors = self.blend * (1.0 - offsets / max_offset * (1.0 - self.anti_bump))
 
-            basis_layer = bm.verts.layers.shape.get(basis_kb.name)
-            shape_layer = bm.verts.layers.shape.get(active_kb.name)
+            new_delta, count = smooth_field(delta, operator, indices, factors, int(self.iterations), **options)
+            new_co = basis_co + new_delta
+        self.print("Iterations: {}".format(count))
 
-            self.smooth_shape_key(obj, bm, selected_verts, basis_layer, shape_layer)
+        verts = bm.verts
+        for i, co in zip(indices.tolist(), new_co[indices].tolist()):
+            verts[i].co = co
 
         bm.normal_update()
         bmesh.update_edit_mesh(obj.data)
@@ -56,79 +98,6 @@ class MESH_OT_mio3sk_smooth_shape(Mio3SKOperator):
         self.print_time()
         return {"FINISHED"}
 
-    def smooth_shape_key(self, obj, bm, selected_verts, basis_layer, shape_layer):
-        vert_neighbors = {}
-        for v in selected_verts:
-            vert_neighbors[v.index] = [e.other_vert(v) for e in v.link_edges]
-
-        offsets = {}
-        max_offset = 0.0
-        for v in selected_verts:
-            basis_co = v[basis_layer]
-            shape_co = v[shape_layer]
-            offset = (shape_co - basis_co).length
-            offsets[v.index] = offset
-            max_offset = max(max_offset, offset)
-        max_offset = max(max_offset, 0.000001)
-
-        anti_bump_factor = 1.0 - self.anti_bump
-        movement_factors = {}
-        for v_idx, offset in offsets.items():
-            normalized_offset = offset / max_offset
-            movement_factors[v_idx] = 1.0 - normalized_offset * anti_bump_factor
-
-        blend = self.blend
-        for _ in range(int(self.iterations)):
-            new_positions = {}
-
-            for v in selected_verts:
-                v_idx = v.index
-                connected_verts = vert_neighbors[v_idx]
-                if not connected_verts:
-                    continue
-
-                basis_co = v[basis_layer]
-                shape_co = v[shape_layer]
-
-                # 平均を計算
-                total_offset = Vector((0, 0, 0))
-                for conn_v in connected_verts:
-                    total_offset += conn_v[shape_layer] - conn_v[basis_layer]
-
-                avg_offset = total_offset / len(connected_verts)
-                blended_co = basis_co + avg_offset
-
-                # 凸凹補正
-                adjusted_factor = blend * movement_factors[v_idx]
-                result_co = shape_co.lerp(blended_co, adjusted_factor)
-
-                new_positions[v] = result_co
-
-            for v, new_co in new_positions.items():
-                v.co = new_co
-
-            obj.update_from_editmode()
-
-    def smooth_laplacian(self, obj, bm):
-        selected_verts = {v for v in bm.verts if v.select}
-
-        for _ in range(int(self.iterations)):
-            new_positions = {}
-            for v in selected_verts:
-                linked_verts = [e.other_vert(v) for e in v.link_edges]
-                if not linked_verts:
-                    continue
-                avg_pos = Vector((0, 0, 0))
-                for linked_v in linked_verts:
-                    avg_pos += linked_v.co
-                avg_pos /= len(linked_verts)
-                new_positions[v] = v.co.lerp(avg_pos, self.blend)
-
-            for v, new_co in new_positions.items():
-                v.co = new_co
-
-        obj.update_from_editmode()
-
     @classmethod
     def poll(cls, context):
         obj = context.active_object
@@ -138,10 +107,16 @@ class MESH_OT_mio3sk_smooth_shape(Mio3SKOperator):
         layout = self.layout
         layout.use_property_split = True
         layout.use_property_decorate = False
+        layout.prop(self, "method")
         layout.prop(self, "blend")
         layout.prop(self, "iterations")
         if self.mode == "SHAPE_KEY":
             layout.prop(self, "anti_bump")
+        row = layout.row(heading="収束で停止")
+        row.prop(self, "use_convergence", text="")
+        sub = row.row()
+        sub.active = self.use_convergence
+        sub.prop(self, "tolerance", text="")
 
 
 def register():
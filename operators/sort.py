@@ -1,7 +1,8 @@
 import bpy
+import time
 from bpy.props import BoolProperty, EnumProperty
 from ..classes.operator import Mio3SKOperator
-from ..utils.utils import is_local_obj, has_shape_key, clear_shape_keys_selection
+from ..utils.utils import is_local_obj, has_shape_key, is_sync_collection, reorder_shape_keys
 from ..utils.ext_data import get_key_groups, get_group_ext, refresh_data
 
 
@@ -18,6 +19,7 @@ class OBJECT_OT_mio3sk_sort(Mio3SKOperator):
             ("ACTIVE_GROUP", "アクティブグループのみソート", ""),
             ("GROUP", "グループをソート", ""),
             ("OBJECT", "他のオブジェクトの順に合わせる", ""),
+            ("SYNC", "同期コレクションをアクティブの順に合わせる", ""),
         ],
         default="ALL",
     )
@@ -51,6 +53,10 @@ class OBJECT_OT_mio3sk_sort(Mio3SKOperator):
             box = layout.box()
             box.label(text="他のオブジェクトの順に合わせる", icon="SHAPEKEY_DATA")
             box.prop(context.window_manager.mio3sk, "sort_source")
+        elif self.method == "SYNC":
+            box = layout.box()
+            box.label(text="同期コレクションをアクティブの順に合わせる", icon="SHAPEKEY_DATA")
+            box.prop(context.active_object.mio3sk, "syncs")
         else:
             layout.prop(self, "type", expand=True)
             if self.method == "ALL":
@@ -102,6 +108,38 @@ class OBJECT_OT_mio3sk_sort(Mio3SKOperator):
 
         return [k.name for group in groups for k in group]
 
+    # 基準の並び順に合わせる（基準にないキーは名前順で末尾）
+    @staticmethod
+    def get_source_order_names(source_names, target_names):
+        target_set = set(target_names)
+        source_set = set(source_names)
+        matched = [name for name in source_names if name in target_set]
+        unmatched = sorted([name for name in target_names if name not in source_set], key=str.lower)
+        return matched + unmatched
+
+    # 同期コレクションのオブジェクトをアクティブの順に合わせる
+    def sort_sync_collection(self, context, obj):
+        if not is_sync_collection(obj):
+            self.report({"WARNING"}, "Collection Sync is not set")
+            return {"CANCELLED"}
+
+        source_names = obj.data.shape_keys.key_blocks.keys()[1:]
+        for ob in obj.mio3sk.syncs.objects:
+            if ob == obj or ob.mode != "OBJECT" or not is_local_obj(ob) or not has_shape_key(ob):
+                continue
+            start_time = time.time()
+            key_blocks = ob.data.shape_keys.key_blocks
+            current_key_name = ob.active_shape_key.name
+            sorted_names = self.get_source_order_names(source_names, key_blocks.keys()[1:])
+            with context.temp_override(object=ob, active_object=ob):
+                moves = reorder_shape_keys(ob, sorted_names)
+            ob.active_shape_key_index = key_blocks.find(current_key_name)
+            refresh_data(context, ob, check=True, group=True, filter=True)
+            self.report(
+                {"INFO"}, "[{}] {} moves ({:.3f}s)".format(ob.name, moves, time.time() - start_time)
+            )
+        return {"FINISHED"}
+
     def execute(self, context):
         self.start_time()
         obj = context.active_object
@@ -111,15 +149,17 @@ class OBJECT_OT_mio3sk_sort(Mio3SKOperator):
 
         key_blocks = obj.data.shape_keys.key_blocks
 
+        if self.method == "SYNC":
+            result = self.sort_sync_collection(context, obj)
+            self.print_time()
+            return result
+
         if self.method == "OBJECT" and prop_w.sort_source:
             source_obj = prop_w.sort_source
             if not source_obj.data.shape_keys:
                 return {"CANCELLED"}
-            source_names = [kb.name for kb in source_obj.data.shape_keys.key_blocks[1:]]
-            target_names = [kb.name for kb in key_blocks[1:]]
-            matched = [name for name in source_names if name in target_names]
-            unmatched = sorted([name for name in target_names if name not in source_names], key=str.lower)
-            sorted_names = matched + unmatched
+            source_names = source_obj.data.shape_keys.key_blocks.keys()[1:]
+            sorted_names = self.get_source_order_names(source_names, key_blocks.keys()[1:])
         elif self.method == "GROUP" and self.use_group:
             sorted_names = self.get_group_sort_names(obj)
         elif self.method == "ACTIVE_GROUP":
@@ -132,14 +172,10 @@ class OBJECT_OT_mio3sk_sort(Mio3SKOperator):
         if sorted_names is None:
             return {"CANCELLED"}
 
-        clear_shape_keys_selection(key_blocks)
-
         current_key_name = obj.active_shape_key.name
-        for key in sorted_names:
-            idx = key_blocks.find(key)
-            obj.active_shape_key_index = idx
-            bpy.ops.object.shape_key_move(type="BOTTOM")
+        moves = reorder_shape_keys(obj, sorted_names)
         obj.active_shape_key_index = key_blocks.find(current_key_name)
+        self.print("Moves: {}".format(moves))
 
         prop_w.sort_source = None
         refresh_data(context, obj, check=True, group=True, filter=True)
@@ -1,9 +1,9 @@
 import bpy
-import bmesh
+import numpy as np
 from bpy.props import BoolProperty
 from ..classes.operator import Mio3SKOperator
 from ..utils.utils import is_local_obj, valid_shape_key
-from ..utils.mesh import find_x_mirror_verts
+from ..utils.mesh import mirror_mask_x
 
 
 class OBJECT_OT_mio3sk_switch_with_basis(Mio3SKOperator):
@@ -44,36 +44,21 @@ class OBJECT_OT_mio3sk_switch_with_basis(Mio3SKOperator):
 
         if self.selected:
             selected_names = {ext.name for ext in obj.mio3sk.ext_data if ext.select}
-            target_key_blocks = [kb for kb in key_blocks if kb.name in selected_names]
+            target_key_blocks = [kb for kb in key_blocks[1:] if kb.name in selected_names]
         else:
             target_key_blocks = [obj.active_shape_key]
 
-        for kb in target_key_blocks:
-            bm = bmesh.new()
-            bm.from_mesh(obj.data)
-            bm.verts.ensure_lookup_table()
-
+        basis_kb = obj.data.shape_keys.reference_key
+        target_key_blocks = [kb for kb in target_key_blocks if kb != basis_kb]
+        if target_key_blocks:
             if is_edit:
-                selected_verts = {v for v in bm.verts if v.select}
+                mask = np.zeros(len(obj.data.vertices), dtype=bool)
+                obj.data.vertices.foreach_get("select", mask)
                 if obj.use_mesh_mirror_x:
-                    selected_verts.update(find_x_mirror_verts(bm, selected_verts))
-                target_vert_indices = {v.index for v in selected_verts}
+                    mask = mirror_mask_x(obj, mask)
             else:
-                target_vert_indices = None
-
-            basis_co = [v.co.copy() for v in bm.verts]
-            shape_co = [kb.data[i].co.copy() for i in range(len(bm.verts))]
-
-            for i in range(len(bm.verts)):
-                if not is_edit or i in target_vert_indices:
-                    bm.verts[i].co = shape_co[i]
-
-            bm.to_mesh(obj.data)
-            bm.free()
-
-            for i, co in enumerate(basis_co):
-                if not is_edit or i in target_vert_indices:
-                    kb.data[i].co = co
+                mask = None
+            self.switch_with_basis(obj, target_key_blocks, mask)
 
         if is_edit:
             bpy.ops.object.mode_set(mode="EDIT")
@@ -82,6 +67,53 @@ class OBJECT_OT_mio3sk_switch_with_basis(Mio3SKOperator):
         self.print_time()
         return {"FINISHED"}
 
+    @staticmethod
+    def switch_with_basis(obj, target_key_blocks, mask=None):
+        """Basisと対象キーの形状を入れ替える（mask の頂点のみ）
+        複数のキーは順に入れ替えた場合と同じ結果になる。Basis基準の他のキーは差分を保つ
+        """
+        key_blocks = obj.data.shape_keys.key_blocks
+        basis_kb = obj.data.shape_keys.reference_key
+        v_len = len(obj.data.vertices)
+
+        co_buf = np.empty(v_len * 3, dtype=np.float32)
+        co = co_buf.reshape(-1, 3)
+        basis_kb.data.foreach_get("co", co_buf)
+        basis_co = co.copy()
+
+        # 新しいBasis = Basis + 各キーの差分の合計
+        target_names = {kb.name for kb in target_key_blocks}
+        deltas = {}
+        offset = np.zeros_like(basis_co)
+        for kb in target_key_blocks:
+            kb.data.foreach_get("co", co_buf)
+            delta = co - basis_co
+            if mask is not None:
+                delta[~mask] = 0.0
+            deltas[kb.name] = delta
+            offset += delta
+        new_basis_co = basis_co + offset
+
+        for kb in key_blocks[1:]:
+            if kb.name in target_names:
+                if mask is None:
+                    co[:] = new_basis_co - deltas[kb.name]
+                else:
+                    # mask 外の頂点はキーの形状を保つ
+                    kb.data.foreach_get("co", co_buf)
+                    co += offset
+                    co[mask] = new_basis_co[mask] - deltas[kb.name][mask]
+            elif kb.relative_key == basis_kb:
+                kb.data.foreach_get("co", co_buf)
+                co += offset
+            else:
+                continue
+            kb.data.foreach_set("co", co_buf)
+
+        new_basis_flat = new_basis_co.ravel()
+        basis_kb.data.foreach_set("co", new_basis_flat)
+        obj.data.vertices.foreach_set("co", new_basis_flat)
+
 
 def register():
     bpy.utils.register_class(OBJECT_OT_mio3sk_switch_with_basis)
@@ -1,9 +1,11 @@
 import bpy
 import bmesh
+import numpy as np
 from mathutils import Vector, kdtree
 from bpy.props import FloatProperty, EnumProperty
 from ..classes.operator import Mio3SKOperator
 from ..utils.utils import is_local_obj, has_shape_key
+from ..utils.key_stats import build_mirror_pairs, invalidate_key_stats
 
 
 class MESH_OT_mio3sk_symmetrize(Mio3SKOperator):
@@ -25,6 +27,11 @@ class MESH_OT_mio3sk_symmetrize(Mio3SKOperator):
         default="POSITIVE_X",
     )
     threshold: FloatProperty(name="Threshold", default=0.0001, min=0.00001, step=0.001, precision=4, options={"HIDDEN"})
+    mode: EnumProperty(
+        name="Mode",
+        items=[("ACTIVE", "Active Shape Key", ""), ("SELECTED", "Selected Shape Keys", "")],
+        options={"SKIP_SAVE"},
+    )
 
     @classmethod
     def poll(cls, context):
@@ -41,15 +48,25 @@ class MESH_OT_mio3sk_symmetrize(Mio3SKOperator):
         basis_kb = obj.data.shape_keys.reference_key
         active_kb = obj.active_shape_key
 
-        if active_kb == basis_kb:
-            return {"CANCELLED"}
-
         if obj. type == "LATTICE":
+            if active_kb == basis_kb:
+                return {"CANCELLED"}
             self.lattice_symmetrize(obj)
             return {"FINISHED"}
 
         if not is_edit:
-            bpy.ops.object.mode_set(mode="EDIT")
+            # オブジェクトモードでは編集モードを経由せずにまとめて処理する
+            names = [name for name in self.get_selected_names(obj, self.mode) if name != basis_kb.name]
+            if not names:
+                return {"CANCELLED"}
+            self.symmetrize_keys(obj, names)
+            invalidate_key_stats(obj, names)
+            obj.data.update()
+            self.print_time()
+            return {"FINISHED"}
+
+        if active_kb == basis_kb:
+            return {"CANCELLED"}
 
         bm = bmesh.from_edit_mesh(obj.data)
         bm.verts.ensure_lookup_table()
@@ -58,7 +75,7 @@ class MESH_OT_mio3sk_symmetrize(Mio3SKOperator):
         if not basis_layer or not active_layer:
             return {"CANCELLED"}
 
-        selected_verts = bm.verts if not is_edit else {v for v in bm.verts if v.select}
+        selected_verts = {v for v in bm.verts if v.select}
         symmetry_pairs = self.find_symmetry_pairs(bm, selected_verts, basis_layer)
 
         axis_type = self.direction.split("_")[1]
@@ -78,13 +95,34 @@ class MESH_OT_mio3sk_symmetrize(Mio3SKOperator):
             v_dst.co = dst_basis + mirrored_delta
 
         bmesh.update_edit_mesh(obj.data)
-        if not is_edit:
-            bpy.ops.object.mode_set(mode="OBJECT")
-
 
         self.print_time()
         return {"FINISHED"}
 
+    def symmetrize_keys(self, obj, names):
+        key_blocks = obj.data.shape_keys.key_blocks
+        v_len = len(obj.data.vertices)
+        axis = "XYZ".index(self.direction.split("_")[1])
+        positive = self.direction.startswith("POSITIVE")
+
+        co_buf = np.empty(v_len * 3, dtype=np.float32)
+        obj.data.shape_keys.reference_key.data.foreach_get("co", co_buf)
+        basis_co = co_buf.reshape(-1, 3).copy()
+
+        # ペアは1回だけ求める
+        src, dst = build_mirror_pairs(basis_co, self.threshold, axis=axis)
+        side = basis_co[src, axis] >= 0 if positive else basis_co[src, axis] <= 0
+        src, dst = src[side], dst[side]
+
+        flip = np.ones(3, dtype=np.float32)
+        flip[axis] = -1.0
+        co = co_buf.reshape(-1, 3)
+        for name in names:
+            kb = key_blocks[name]
+            kb.data.foreach_get("co", co_buf)
+            co[dst] = basis_co[dst] + (co[src] - basis_co[src]) * flip
+            kb.data.foreach_set("co", co_buf)
+
     def find_symmetry_pairs(self, bm, selected_verts, basis_layer):
         pairs = []
         symm_co = Vector()
@@ -12,7 +12,7 @@ from bpy.props import (
 )
 from .icons import icons
 from .utils.utils import has_shape_key
-from .utils.ext_data import refresh_data, refresh_filter_flag, refresh_ui_select
+from .utils.ext_data import refresh_data, refresh_filter_flag, refresh_ui_select, invalidate_group_cache
 from .globals import TAG_COLOR_DEFAULT, LABEL_COLOR_DEFAULT
 from .subscribe import callback_show_only_shape_key
 
@@ -146,6 +146,7 @@ class OBJECT_PG_mio3sk_ext_data(PropertyGroup):
 
     def callback_is_group(self, context):
         # refresh_filter_flag(context, context.object)
+        invalidate_group_cache(context.object)
         refresh_data(context, context.object, group=True, filter=True)
 
     def callback_is_group_color(self, context):
@@ -246,6 +247,8 @@ class OBJECT_PG_mio3sk_ext_data(PropertyGroup):
 # フループ名
 class OBJECT_PG_mio3sk_group(PropertyGroup):
     label: StringProperty(name="Label", options=set())
+    start: IntProperty(name="Start Index", default=0, options=set())
+    end: IntProperty(name="End Index", default=0, options=set())
 
 
 # オブジェクト
@@ -289,6 +292,7 @@ class OBJECT_PG_mio3sk(PropertyGroup):
     group_dirty: BoolProperty(name="Groups Dirty", default=False, options=set())
     composer_dirty: BoolProperty(name="Composer Dirty", default=False, options=set())
     tag_dirty: BoolProperty(name="Tag Dirty", default=False, options=set())
+    group_index_token: IntProperty(name="Group Index Token", default=0, options=set())
 
     # 機能の使用
     syncs: PointerProperty(name="Collection Sync", type=Collection, update=callback_syncs, options=set())
@@ -455,6 +459,16 @@ class WM_PG_mio3sk(PropertyGroup):
         options=set(),
         # poll=poll_source_object,
     )
+    stats_sort: EnumProperty(
+        name="Sort",
+        items=[
+            ("NONE", "Key Order", ""),
+            ("MAX_DISP", "Max Displacement", ""),
+            ("MOVED", "Moved Vertices", ""),
+            ("SYM_ERROR", "Asymmetry", ""),
+        ],
+        options=set(),
+    )
     smart_preview: BoolProperty(name="Smart Preview", description="アクティブキーをプレビューします（ロックしたシェイプキーの値を維持します）", default=False, options=set())
 
 
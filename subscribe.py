@@ -3,14 +3,19 @@ from bpy.types import Object
 from bpy.app.handlers import persistent
 from .globals import get_preferences
 from .utils.utils import is_obj, is_local_obj, is_local, has_shape_key, is_sync_collection, clear_shape_keys_selection
-from .utils.ext_data import check_update, refresh_data, rename_ext_data
+from .utils.ext_data import check_update, refresh_data, rename_ext_data_batch
 from .utils.mirror import get_mirror_name
+from .utils.key_stats import invalidate_key_stats
 
 
 def callback_mode():
     context = bpy.context
     obj = context.active_object
 
+    # 編集モードやスカルプトモードで変更されるのはアクティブキーのみ
+    if is_obj(obj) and has_shape_key(obj):
+        invalidate_key_stats(obj, [obj.active_shape_key.name])
+
     # コンポジションの自動適用
     if is_obj(obj) and obj.mode == "OBJECT" and has_shape_key(obj):
         prop_s = context.scene.mio3sk
@@ -155,15 +160,21 @@ def callback_show_only_shape_key():
 
 
 # 名前変更の自動ミラーリング
-def callback_rename(context, obj, old_name, new_name):
+def callback_rename(context, obj, rename_map):
     pref = get_preferences()
-    if pref.use_rename_mirror:
+    if not pref.use_rename_mirror:
+        return
+    key_blocks = obj.data.shape_keys.key_blocks
+    mirror_map = {}
+    for old_name, new_name in rename_map.items():
         old_mirror_name = get_mirror_name(old_name) or old_name
         new_mirror_name = get_mirror_name(new_name) or new_name
-        key_blocks = obj.data.shape_keys.key_blocks
+        if old_mirror_name in mirror_map or new_mirror_name in mirror_map.values():
+            continue
         if old_mirror_name in key_blocks and new_mirror_name not in key_blocks:
             key_blocks[old_mirror_name].name = new_mirror_name
-            rename_ext_data(context, obj, old_mirror_name, new_mirror_name)
+            mirror_map[old_mirror_name] = new_mirror_name
+    rename_ext_data_batch(context, obj, mirror_map)
 
 
 def callback_name():
@@ -237,6 +248,7 @@ def undo_redo_handler(scene):
     context = bpy.context
     obj = context.object
     if is_local_obj(obj) and has_shape_key(obj):
+        invalidate_key_stats(obj)
         check_update(context, context.object, callback_rename=callback_rename)
         refresh_data(context, obj, group=True, filter=True)
 
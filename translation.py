@@ -27,6 +27,7 @@ translation_dict = {
         # Collection Sync
         ("*", "Collection Sync"): "コレクション同期",
         ("*", "Change other sync objects"): "同期コレクションも変更",
+        ("*", "Collection Sync is not set"): "コレクション同期が設定されていません",
 
         # Shape Sync
         ("*", "Shape Sync"): "シェイプ同期",
@@ -91,6 +92,16 @@ translation_dict = {
         ("Operator", "Create Mirror Shape Keys"):"反転したシェイプキーを生成",
 
 
+        # Statistics
+        ("*", "Statistics"): "統計",
+        ("*", "Key Order"): "キーの順",
+        ("*", "Max Displacement"): "最大移動量",
+        ("*", "Moved Vertices"): "移動頂点数",
+        ("*", "Asymmetry"): "非対称",
+        ("*", "Max"): "最大",
+        ("*", "Moved"): "移動",
+        ("*", "Asym"): "非対称",
+
         # Batch Rename
         ("*", "Regular expression syntax is incorrect"): "正規表現が正しくありません",
 
@@ -125,6 +125,7 @@ class MIO3SK_MT_select_keys_edit(Menu):
         layout.operator("object.mio3sk_select_all_unused", icon="CHECKMARK")
         layout.operator("object.mio3sk_select_all_by_verts", icon="CHECKMARK")
         layout.operator("object.mio3sk_select_all_asymmetry", icon="CHECKMARK")
+        layout.operator("object.mio3sk_select_all_duplicate", icon="CHECKMARK")
         layout.operator("object.mio3sk_select_all_error", icon="CHECKMARK")
 
         layout.separator()
@@ -134,6 +135,8 @@ class MIO3SK_MT_select_keys_edit(Menu):
             layout.separator()
         layout.operator("object.mio3sk_reset", icon_value=icons.eraser)
         layout.operator("object.mio3sk_clean_selected", icon="MOD_FLUIDSIM").mode = "SELECTED"
+        if context.object.mode == "OBJECT":
+            layout.operator("mesh.mio3sk_symmetrize", text="選択したキーを対称化", icon_value=icons.symmetrize).mode = "SELECTED"
         layout.operator("object.mio3sk_generate_mesh", icon="MONKEY")
         layout.separator()
         layout.operator("object.mio3sk_shape_key_remove", text="Delete Selected Shape Keys", icon="X").mode = "SELECTED"
@@ -156,6 +159,7 @@ class MIO3SK_MT_io_import_menu(Menu):
         layout.operator("object.mio3sk_transfer_settings", icon="IMPORT")
         layout.separator()
         layout.operator("object.mio3sk_import_composer_rules", icon="IMPORT")
+        layout.operator("object.mio3sk_restore_attr", icon="IMPORT")
 
 
 class MIO3SK_MT_io_export_menu(Menu):
@@ -166,6 +170,7 @@ class MIO3SK_MT_io_export_menu(Menu):
         layout.operator("object.mio3sk_output_shape_keys", icon="EXPORT")
         layout.operator("object.mio3sk_export_composer_rules", icon="EXPORT")
         layout.operator("object.mio3sk_bake_attr", icon="EXPORT")
+        layout.operator("object.mio3sk_bake_attr", text="選択したキーを属性にベイク", icon="EXPORT").selected = True
 
 
 class MIO3SK_MT_tag_settings(Menu):
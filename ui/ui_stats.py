@@ -0,0 +1,100 @@
+import bpy
+from bpy.types import UIList, UI_UL_list
+from ..classes.operator import Mio3SKPanel
+from ..utils.utils import has_shape_key
+from ..utils.key_stats import get_cached_key_stats
+
+
+class MIO3SK_PT_sub_key_stats(Mio3SKPanel):
+    bl_label = "Statistics"
+    bl_parent_id = "MIO3SK_PT_main"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.object
+        return obj is not None and obj.type == "MESH" and has_shape_key(obj)
+
+    def draw(self, context):
+        layout = self.layout
+        obj = context.object
+        prop_w = context.window_manager.mio3sk
+
+        row = layout.row(align=True)
+        row.prop(prop_w, "stats_sort", text="")
+        row.operator("object.mio3sk_refresh_key_stats", icon="FILE_REFRESH", text="")
+
+        split = layout.split(factor=0.46)
+        split.label(text="Shape Key Name")
+        sub = split.row()
+        sub.label(text="Max")
+        sub.label(text="Moved")
+        sub.label(text="Asym")
+
+        layout.template_list(
+            "MIO3SK_UL_key_stats",
+            "",
+            obj.data.shape_keys,
+            "key_blocks",
+            obj,
+            "active_shape_key_index",
+            rows=8,
+        )
+
+
+class MIO3SK_UL_key_stats(UIList):
+    sort_fields = {"MAX_DISP": "max_disp", "MOVED": "moved", "SYM_ERROR": "sym_error"}
+
+    def draw_item(self, context, layout, data, key_block, icon, obj, active_property, index):
+        stats = get_cached_key_stats(obj).get(key_block.name)
+        split = layout.split(factor=0.46)
+        split.label(text=key_block.name, translate=False)
+        row = split.row()
+        if stats is None:
+            row.label(text="-")
+            row.label(text="-")
+            row.label(text="-")
+            return
+        row.label(text="{:.4f}".format(stats["max_disp"]))
+        row.label(text="{}".format(stats["moved"]))
+        row.label(text="-" if stats["sym_error"] is None else "{:.4f}".format(stats["sym_error"]))
+
+    def filter_items(self, context, data, propname):
+        obj = context.object
+        items = getattr(data, propname)
+        prop_w = context.window_manager.mio3sk
+
+        bit_on = self.bitflag_filter_item
+        flt_flags = [bit_on] * len(items)
+        if flt_flags:
+            flt_flags[0] = 0  # Basis
+
+        flt_order = []
+        field = self.sort_fields.get(prop_w.stats_sort)
+        if field:
+            key_stats = get_cached_key_stats(obj)
+            sort_data = []
+            for i, item in enumerate(items):
+                value = key_stats[item.name][field] if item.name in key_stats else None
+                sort_data.append((i, -1 if value is None else value))
+            flt_order = UI_UL_list.sort_items_helper(sort_data, lambda e: e[1], reverse=True)
+        elif self.use_filter_sort_alpha and len(items) > 1:
+            flt_order = UI_UL_list.sort_items_by_name(items, "name")
+
+        return flt_flags, flt_order
+
+
+classes = [
+    MIO3SK_PT_sub_key_stats,
+    MIO3SK_UL_key_stats,
+]
+
+
+def register():
+    for c in classes:
+        bpy.utils.register_class(c)
+
+
+def unregister():
+    for c in reversed(classes):
+        bpy.utils.unregister_class(c)
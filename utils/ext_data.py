@@ -1,3 +1,4 @@
+from itertools import count
 from bpy.types import Context, Object, ShapeKey
 from ..globals import LABEL_COLOR_DEFAULT
 from .utils import has_shape_key
@@ -72,11 +73,10 @@ def check_update(context: Context, obj: Object, callback_rename=None):
         if set(rename_keys.keys()) == set(rename_keys.values()):
             return latest_key_names  # 移動のみ
 
-        for old_name, new_name in rename_keys.items():
-            # debug_function("[🍇RENAME] <{}> Shapekey {} -> {}", [obj.name, old_name, new_name])
-            rename_ext_data(context, obj, old_name, new_name)
-            if callback_rename:
-                callback_rename(context, obj, old_name, new_name)
+        # debug_function("[🍇RENAME] <{}> Shapekey {}", [obj.name, rename_keys])
+        rename_ext_data_batch(context, obj, rename_keys)
+        if callback_rename:
+            callback_rename(context, obj, rename_keys)
 
     elif added_keys or removed_keys:
         if added_keys:
@@ -110,74 +110,152 @@ def remove_ext_data(obj: Object, removed_keys):
 
 def rename_ext_data(context: Context, obj: Object, old_name, new_name):
     """拡張プロパティで使用している名前の更新 拡張データ名、ソース元、プリセット、グループ"""
-    # debug_function("  🍊rename_ext_data <{}> {} -> {}", [obj.name, old_name, new_name])
+    rename_ext_data_batch(context, obj, {old_name: new_name})
+
+
+def rename_ext_data_batch(context: Context, obj: Object, rename_map: dict[str, str]):
+    """拡張プロパティで使用している名前を一括で更新（旧名→新名の辞書を1パスで適用）"""
+    if not rename_map:
+        return
+    # debug_function("  🍊rename_ext_data_batch <{}> {}", [obj.name, rename_map])
     prop_s = context.scene.mio3sk
-    prefix = ("---", "===") if prop_s.use_group_prefix == "AUTO" else prop_s.group_prefix
+    use_prefix = prop_s.use_group_prefix
+    prefix = ("---", "===") if use_prefix == "AUTO" else prop_s.group_prefix
     for ext in obj.mio3sk.ext_data:
         # ext自体を更新
-        if ext.name == old_name:
+        if (new_name := rename_map.get(ext.name)) is not None:
             ext.name = new_name
-            if prop_s.use_group_prefix != "NONE":
+            if use_prefix != "NONE":
                 ext["is_group"] = new_name.startswith(prefix)
             ext["is_group_close"] = False
 
         # コンポジションのソースになってる名前を更新
         for item in ext.composer_source:
-            if item.name == old_name:
+            if (new_name := rename_map.get(item.name)) is not None:
                 item["name"] = new_name
 
     for preset in obj.mio3sk.preset_list:
         for item in preset.shape_keys:
-            if item.name == old_name:
+            if (new_name := rename_map.get(item.name)) is not None:
                 item["name"] = new_name
 
     for group in obj.mio3sk.groups:
-        if group.name == old_name:
+        if (new_name := rename_map.get(group.name)) is not None:
             group["name"] = new_name
             group["label"] = new_name.strip("=-+*#~@★ ")
 
 
-def refresh_group_data(context: Context, obj: Object):
-    """グループ関連データを更新"""
-    # debug_function("  🐡 refresh_group_data <{}>", obj.name)
-    prop_o = obj.mio3sk
-    ext_data = prop_o.ext_data
-    prop_s = context.scene.mio3sk
-    key_blocks = obj.data.shape_keys.key_blocks
+# グループインデックスのキャッシュ {session_uid: (token, prefix_state, key_names)}
+_group_index_cache = {}
+_group_index_token = count(1)
 
+
+def _get_group_prefix_state(context: Context):
+    prop_s = context.scene.mio3sk
     use_prefix = prop_s.use_group_prefix
     prefix = ("---", "===") if use_prefix == "AUTO" else prop_s.group_prefix
+    return use_prefix, prefix
 
-    current = None
-    groups = {}
-    # ※ key_blocksはキー順に処理するため
-    for kb in key_blocks[1:]:
-        ext = ext_data.get(kb.name)
+
+def invalidate_group_cache(obj: Object):
+    """キー順を変えずに拡張データを変更した場合（修復や is_group の切り替え）に、次の更新ですべて作り直す"""
+    obj.mio3sk.group_index_token = 0
+
+
+def _scan_group_headers(obj: Object, key_names, prefix_state):
+    """キー順でグループヘッダーの位置を取得"""
+    ext_data = obj.mio3sk.ext_data
+    ext_names = ext_data.keys()
+    use_prefix, prefix = prefix_state
+    if use_prefix != "NONE":
+        ext_name_set = set(ext_names)
+        return [i for i in range(1, len(key_names)) if key_names[i] in ext_name_set and key_names[i].startswith(prefix)]
+
+    flags = [False] * len(ext_names)
+    ext_data.foreach_get("is_group", flags)
+    head_names = {name for name, flag in zip(ext_names, flags) if flag}
+    return [i for i in range(1, len(key_names)) if key_names[i] in head_names]
+
+
+def _refresh_group_span(get_ext, key_names, start, stop, header_ext, use_prefix):
+    """start から stop の手前までのキーをグループのメンバーとして更新し、メンバー数を返す"""
+    color = header_ext.group_color if header_ext else LABEL_COLOR_DEFAULT
+    member_len = 0
+    for name in key_names[start:stop]:
+        ext = get_ext(name)
         if ext is None:
             continue
-
         if use_prefix != "NONE":
-            ext["is_group"] = ext.name.startswith(prefix)
+            ext["is_group"] = False
+        ext["group_color"] = color
+        member_len += 1
+    return member_len
 
-        if ext.is_group:
-            current = ext
-            groups.setdefault(ext.name, [ext, 0])
-            continue
 
-        ext["group_color"] = current.group_color if current else LABEL_COLOR_DEFAULT
+def refresh_group_data(context: Context, obj: Object):
+    """グループ関連データを更新（ヘッダーが変わっていなければ変更のあった範囲のみ更新）"""
+    # debug_function("  🐡 refresh_group_data <{}>", obj.name)
+    prop_o = obj.mio3sk
+    prefix_state = _get_group_prefix_state(context)
+    key_names = obj.data.shape_keys.key_blocks.keys()
+    headers = _scan_group_headers(obj, key_names, prefix_state)
+
+    cache = _group_index_cache.get(obj.session_uid)
+    if (
+        cache is not None
+        and cache[0] == prop_o.group_index_token
+        and cache[1] == prefix_state
+        and prop_o.groups.keys() == [key_names[i] for i in headers]
+    ):
+        update_group_spans(obj, key_names, headers, cache[2], prefix_state[0])
+    else:
+        rebuild_group_data(obj, key_names, headers, prefix_state[0])
+
+    token = next(_group_index_token)
+    prop_o.group_index_token = token
+    _group_index_cache[obj.session_uid] = (token, prefix_state, key_names)
+
+
+def rebuild_group_data(obj: Object, key_names, headers, use_prefix):
+    """グループ関連データをすべて作り直す"""
+    prop_o = obj.mio3sk
+    ext_by_name = {ext.name: ext for ext in prop_o.ext_data}
+    bounds = headers + [len(key_names)]
 
-        if current:
-            group = groups.get(current.name)
-            if group:
-                group[1] += 1
+    _refresh_group_span(ext_by_name.get, key_names, 1, bounds[0], None, use_prefix)
 
     prop_o.groups.clear()
-    for head_name, (ext, count) in groups.items():
-        if ext and ext.is_group:
-            ext["group_len"] = count
-            group = prop_o.groups.add()
-            group.name = head_name
-            group.label = ext.name.strip("=-+*#~")
+    for start, stop in zip(bounds, bounds[1:]):
+        ext = ext_by_name[key_names[start]]
+        if use_prefix != "NONE":
+            ext["is_group"] = True
+        ext["group_len"] = _refresh_group_span(ext_by_name.get, key_names, start + 1, stop, ext, use_prefix)
+        group = prop_o.groups.add()
+        group.name = ext.name
+        group.label = ext.name.strip("=-+*#~")
+        group.start = start
+        group.end = stop - 1
+
+
+def update_group_spans(obj: Object, key_names, headers, old_key_names, use_prefix):
+    """ヘッダーの並びが同じ場合に、内容が変わったグループの範囲だけを更新する"""
+    prop_o = obj.mio3sk
+    ext_data = prop_o.ext_data
+    groups = prop_o.groups
+    bounds = headers + [len(key_names)]
+
+    # 先頭の未分類
+    old_stop = groups[0].start if groups else len(old_key_names)
+    if key_names[1 : bounds[0]] != old_key_names[1:old_stop]:
+        _refresh_group_span(ext_data.get, key_names, 1, bounds[0], None, use_prefix)
+
+    for group, start, stop in zip(groups, bounds, bounds[1:]):
+        if key_names[start:stop] != old_key_names[group.start : group.end + 1]:
+            ext = ext_data.get(key_names[start])
+            ext["group_len"] = _refresh_group_span(ext_data.get, key_names, start + 1, stop, ext, use_prefix)
+        if group.start != start or group.end != stop - 1:
+            group.start = start
+            group.end = stop - 1
 
 
 def refresh_tag_data(context: Context, obj: Object):
@@ -0,0 +1,399 @@
+import os
+import zlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from bpy.types import Object
+from mathutils import kdtree
+
+MOVED_EPSILON = 0.00001
+
+# {session_uid: {"basis_hash", "v_len", "mirror_tolerance", "mirror", "keys": {name: stats}}}
+# キーの統計は invalidate_key_stats で破棄されるまで再計算しない
+_key_stats_cache = {}
+
+
+MIRROR_CELL_LIMIT = 32
+ASYMMETRY_CHUNK_BYTES = 64 * 1024 * 1024
+
+_HASH_PRIMES = np.array([73856093, 19349663, 83492791], dtype=np.int64)
+_NEIGHBOR_OFFSETS = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)], dtype=np.int64)
+
+
+def _hash_cells(cells):
+    h = cells * _HASH_PRIMES
+    return h[:, 0] ^ h[:, 1] ^ h[:, 2]
+
+
+def _build_mirror_pairs_kdtree(co, indices, tolerance, axis=0):
+    flip = [1.0, 1.0, 1.0]
+    flip[axis] = -1.0
+    kd = kdtree.KDTree(len(indices))
+    for i, (x, y, z) in zip(indices.tolist(), co.tolist()):
+        kd.insert((x * flip[0], y * flip[1], z * flip[2]), i)
+    kd.balance()
+
+    pair_indices = []
+    mirror_indices = []
+    for i, c in zip(indices.tolist(), co.tolist()):
+        _, index, dist = kd.find(c)
+        if dist < tolerance:
+            pair_indices.append(i)
+            mirror_indices.append(index)
+    return np.array(pair_indices, dtype=np.int32), np.array(mirror_indices, dtype=np.int32)
+
+
+def build_point_grid(co, cell_size):
+    """点群を cell_size 幅のグリッドに登録する"""
+    co = np.asarray(co, dtype=np.float64)
+    point_hash = _hash_cells(np.floor(co / cell_size).astype(np.int64))
+    order = np.argsort(point_hash, kind="stable")
+    return co, float(cell_size), order, point_hash[order]
+
+
+def query_point_grid(grid, query_co, radius):
+    """query_co の各点から radius 未満にあるグリッドの点をすべて取得 (query_indices, point_indices, dist)
+    radius はセル幅以下であること。セルが密すぎる場合は None
+    """
+    co, cell_size, order, sorted_hash = grid
+    query_co = np.asarray(query_co, dtype=np.float64)
+    query_cells = np.floor(query_co / cell_size).astype(np.int64)
+
+    query_indices, point_indices, dists = [], [], []
+    for offset in _NEIGHBOR_OFFSETS:
+        query_hash = _hash_cells(query_cells + offset)
+        lo = np.searchsorted(sorted_hash, query_hash, side="left")
+        count = np.searchsorted(sorted_hash, query_hash, side="right") - lo
+        max_count = int(count.max()) if len(count) else 0
+        if max_count > MIRROR_CELL_LIMIT:
+            return None
+        for r in range(max_count):
+            has = np.flatnonzero(count > r)
+            candidate = order[lo[has] + r]
+            diff = query_co[has] - co[candidate]
+            dist = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+            near = dist < radius
+            query_indices.append(has[near])
+            point_indices.append(candidate[near])
+            dists.append(dist[near])
+
+    if not query_indices:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    query_indices = np.concatenate(query_indices)
+    point_indices = np.concatenate(point_indices)
+    dists = np.concatenate(dists)
+    # ハッシュの衝突で同じセルを重複して調べた分を除く
+    pair_key = np.unique(np.stack((query_indices, point_indices), axis=1), axis=0, return_index=True)[1]
+    return query_indices[pair_key], point_indices[pair_key], dists[pair_key]
+
+
+def build_mirror_pairs(basis_co, tolerance, mask=None, axis=0):
+    """指定軸で対称な頂点のペアを取得 (pair_indices, mirror_indices)
+    tolerance 幅のグリッドで近傍セルだけを比較する。mask が False の頂点は対象外
+    """
+    indices = np.arange(len(basis_co)) if mask is None else np.flatnonzero(mask)
+    empty = np.empty(0, dtype=np.int32)
+    if not len(indices) or tolerance <= 0.0:
+        return empty, empty
+    co = np.asarray(basis_co, dtype=np.float64)[indices]
+    flip = np.ones(3)
+    flip[axis] = -1.0
+
+    grid = build_point_grid(co * flip, tolerance)
+    pairs = query_point_grid(grid, co, tolerance)
+    if pairs is None:
+        # 許容値が大きすぎてセルが密な場合
+        return _build_mirror_pairs_kdtree(co, indices, tolerance, axis)
+
+    # 最も近い点を採用
+    query_indices, point_indices, dists = pairs
+    order = np.lexsort((dists, query_indices))
+    query_indices, point_indices = query_indices[order], point_indices[order]
+    first = np.ones(len(query_indices), dtype=bool)
+    first[1:] = query_indices[1:] != query_indices[:-1]
+    return indices[query_indices[first]].astype(np.int32), indices[point_indices[first]].astype(np.int32)
+
+
+def build_x_mirror_pairs(basis_co, tolerance, mask=None):
+    """X軸で対称な頂点のペアを取得 (pair_indices, mirror_indices)"""
+    return build_mirror_pairs(basis_co, tolerance, mask, axis=0)
+
+
+def calc_key_stats(delta):
+    """Basisとの差分から統計を計算"""
+    max_abs = float(np.abs(delta).max()) if len(delta) else 0.0
+    if max_abs == 0.0:
+        return {
+            "max_abs": 0.0,
+            "max_disp": 0.0,
+            "moved": 0,
+            "bbox_min": (0.0, 0.0, 0.0),
+            "bbox_max": (0.0, 0.0, 0.0),
+            "sym_error": 0.0,
+            "sym_tolerance": None,
+        }
+
+    lengths = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+    return {
+        "max_abs": max_abs,
+        "max_disp": float(lengths.max()),
+        "moved": int(np.count_nonzero(lengths > MOVED_EPSILON)),
+        "bbox_min": tuple(delta.min(axis=0).tolist()),
+        "bbox_max": tuple(delta.max(axis=0).tolist()),
+        "sym_error": None,
+        "sym_tolerance": None,
+    }
+
+
+def calc_symmetry_error(delta, mirror):
+    """X軸対称の誤差（ペア間の差分の最大成分）を計算"""
+    pair_indices, mirror_indices = mirror
+    if not len(pair_indices):
+        return 0.0
+    mirror_delta = delta[mirror_indices]
+    mirror_delta[:, 0] *= -1
+    return float(np.abs(delta[pair_indices] - mirror_delta).max())
+
+
+def get_key_stats(obj: Object, names=None, mirror_tolerance=None) -> dict[str, dict]:
+    """シェイプキーごとの移動量統計を取得する（キャッシュのないキーだけ再計算）
+    キーの形状を変更した場合は invalidate_key_stats で破棄しておく。Basisが変わった場合はすべて再計算する
+    mirror_tolerance を指定すると、その許容値で対称ペアを求めて sym_error も計算する
+    """
+    shape_keys = obj.data.shape_keys
+    basis_kb = shape_keys.reference_key
+    key_blocks = shape_keys.key_blocks
+    v_len = len(basis_kb.data)
+
+    basis_co = np.empty(v_len * 3, dtype=np.float32)
+    basis_kb.data.foreach_get("co", basis_co)
+    basis_hash = zlib.crc32(basis_co)
+    basis_co = basis_co.reshape(-1, 3)
+
+    cache = _key_stats_cache.get(obj.session_uid)
+    if cache is None or cache["basis_hash"] != basis_hash or cache["v_len"] != v_len:
+        cache = {"basis_hash": basis_hash, "v_len": v_len, "mirror_tolerance": None, "mirror": None, "keys": {}}
+        _key_stats_cache[obj.session_uid] = cache
+
+    if mirror_tolerance is not None and cache["mirror_tolerance"] != mirror_tolerance:
+        cache["mirror"] = build_x_mirror_pairs(basis_co, mirror_tolerance)
+        cache["mirror_tolerance"] = mirror_tolerance
+
+    key_cache = cache["keys"]
+    key_names = key_blocks.keys()
+    for name in set(key_cache) - set(key_names):
+        del key_cache[name]
+
+    target_names = key_names[1:] if names is None else [name for name in names if name in key_blocks]
+
+    co_buf = np.empty(v_len * 3, dtype=np.float32)
+    co = co_buf.reshape(-1, 3)
+    result = {}
+    for name in target_names:
+        kb = key_blocks[name]
+        # 同じ名前で作り直されたキーは別のキーとして扱う
+        pointer = kb.as_pointer()
+        stats = key_cache.get(name)
+        delta = None
+        if stats is None or stats["pointer"] != pointer:
+            kb.data.foreach_get("co", co_buf)
+            delta = co - basis_co
+            stats = calc_key_stats(delta)
+            stats["pointer"] = pointer
+            key_cache[name] = stats
+        if mirror_tolerance is not None and stats["max_abs"] > 0.0 and stats["sym_tolerance"] != mirror_tolerance:
+            if delta is None:
+                kb.data.foreach_get("co", co_buf)
+                delta = co - basis_co
+            stats["sym_error"] = calc_symmetry_error(delta, cache["mirror"])
+            stats["sym_tolerance"] = mirror_tolerance
+        result[name] = stats
+    return result
+
+
+def get_cached_key_stats(obj: Object) -> dict[str, dict]:
+    """計算済みの統計を取得（再計算しない）"""
+    cache = _key_stats_cache.get(obj.session_uid)
+    return cache["keys"] if cache else {}
+
+
+def invalidate_key_stats(obj: Object, names=None):
+    """統計のキャッシュを破棄"""
+    if names is None:
+        _key_stats_cache.pop(obj.session_uid, None)
+    elif cache := _key_stats_cache.get(obj.session_uid):
+        for name in names:
+            cache["keys"].pop(name, None)
+
+
+def calc_asymmetry_scores(obj: Object, names, tolerance, mask=None, mirror=None) -> dict[str, float]:
+    """キーごとの非対称スコア（ミラーペア間の差分の最大成分）を計算
+    キーはメモリ使用量が ASYMMETRY_CHUNK_BYTES 以内になるようにまとめて判定する
+    """
+    shape_keys = obj.data.shape_keys
+    key_blocks = shape_keys.key_blocks
+    v_len = len(shape_keys.reference_key.data)
+
+    co_buf = np.empty(v_len * 3, dtype=np.float32)
+    shape_keys.reference_key.data.foreach_get("co", co_buf)
+    basis_co = co_buf.reshape(-1, 3).copy()
+
+    if mirror is None:
+        mirror = build_x_mirror_pairs(basis_co, tolerance, mask)
+    pair_indices, mirror_indices = mirror
+    if not len(pair_indices):
+        return {name: 0.0 for name in names}
+
+    flip = np.array((-1.0, 1.0, 1.0), dtype=np.float32)
+    basis_pair = basis_co[pair_indices]
+    basis_mirror = basis_co[mirror_indices] * flip
+    chunk_size = max(1, ASYMMETRY_CHUNK_BYTES // (len(pair_indices) * 3 * 4 * 2))
+
+    scores = {}
+    co = co_buf.reshape(-1, 3)
+    for start in range(0, len(names), chunk_size):
+        chunk_names = names[start : start + chunk_size]
+        pair_co = np.empty((len(chunk_names), len(pair_indices), 3), dtype=np.float32)
+        mirror_co = np.empty_like(pair_co)
+        for i, name in enumerate(chunk_names):
+            key_blocks[name].data.foreach_get("co", co_buf)
+            pair_co[i] = co[pair_indices]
+            mirror_co[i] = co[mirror_indices]
+        # (key - basis) - flip(key_m - basis_m)
+        pair_co -= basis_pair
+        mirror_co *= flip
+        mirror_co -= basis_mirror
+        pair_co -= mirror_co
+        np.abs(pair_co, out=pair_co)
+        chunk_scores = pair_co.reshape(len(chunk_names), -1).max(axis=1)
+        scores.update(zip(chunk_names, chunk_scores.tolist()))
+    return scores
+
+
+def _any_moved(chunk, basis_co, threshold_sq):
+    delta = chunk - basis_co
+    return np.any(np.einsum("kij,kij->ki", delta, delta) > threshold_sq, axis=1)
+
+
+def find_moved_keys(obj: Object, names, vert_indices, threshold, chunk_size=64, use_threads=True) -> set[str]:
+    """指定した頂点のいずれかが threshold より移動しているキーを取得する
+    キーは chunk_size 個ずつまとめて判定し、判定は読み込みと並行してスレッドで行う
+    """
+    shape_keys = obj.data.shape_keys
+    key_blocks = shape_keys.key_blocks
+    v_len = len(shape_keys.reference_key.data)
+    vert_indices = np.asarray(vert_indices, dtype=np.int64)
+    if not len(vert_indices) or not names:
+        return set()
+
+    co_buf = np.empty(v_len * 3, dtype=np.float32)
+    shape_keys.reference_key.data.foreach_get("co", co_buf)
+    basis_co = co_buf.reshape(-1, 3)[vert_indices]
+    threshold_sq = np.float32(threshold) ** 2
+
+    chunks = [names[i : i + chunk_size] for i in range(0, len(names), chunk_size)]
+    executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) if use_threads and len(chunks) > 1 else None
+
+    results = []
+    try:
+        for chunk_names in chunks:
+            # bpy へのアクセスはメインスレッドのみ
+            chunk = np.empty((len(chunk_names), len(vert_indices), 3), dtype=np.float32)
+            for i, name in enumerate(chunk_names):
+                key_blocks[name].data.foreach_get("co", co_buf)
+                chunk[i] = co_buf.reshape(-1, 3)[vert_indices]
+            if executor:
+                results.append((chunk_names, executor.submit(_any_moved, chunk, basis_co, threshold_sq)))
+            else:
+                results.append((chunk_names, _any_moved(chunk, basis_co, threshold_sq)))
+    finally:
+        if executor:
+            executor.shutdown(wait=True)
+
+    moved_keys = set()
+    for chunk_names, moved in results:
+        if executor:
+            moved = moved.result()
+        moved_keys.update(name for name, flag in zip(chunk_names, moved) if flag)
+    return moved_keys
+
+
+def calc_delta_sketch(delta, block_starts):
+    """頂点ブロックごとの差分の最大値と最小値（軸ごと）をスケッチとする
+    2つのキーの差分の最大成分が t 以下なら、スケッチの各成分の差も t 以下になる
+    """
+    return np.concatenate((np.maximum.reduceat(delta, block_starts, axis=0), np.minimum.reduceat(delta, block_starts, axis=0))).ravel()
+
+
+def find_duplicate_keys(obj: Object, names, threshold, blocks=64, cache_bytes=256 * 1024 * 1024) -> list[list[str]]:
+    """形状がほぼ同じ（差分の最大成分が threshold 以下）キーのグループを取得する
+    スケッチで候補を絞り込んでから、候補だけ全頂点で比較する。移動していないキーは対象外
+    """
+    shape_keys = obj.data.shape_keys
+    key_blocks = shape_keys.key_blocks
+    v_len = len(shape_keys.reference_key.data)
+    if not v_len:
+        return []
+
+    co_buf = np.empty(v_len * 3, dtype=np.float32)
+    shape_keys.reference_key.data.foreach_get("co", co_buf)
+    basis_co = co_buf.reshape(-1, 3).copy()
+    co = co_buf.reshape(-1, 3)
+    block_starts = np.linspace(0, v_len, min(blocks, v_len), endpoint=False).astype(np.int64)
+
+    def read_delta(name):
+        key_blocks[name].data.foreach_get("co", co_buf)
+        return co - basis_co
+
+    sketch_names = []
+    sketches = []
+    for name in names:
+        delta = read_delta(name)
+        if np.abs(delta).max() <= MOVED_EPSILON:
+            continue
+        sketch_names.append(name)
+        sketches.append(calc_delta_sketch(delta, block_starts))
+    if len(sketch_names) < 2:
+        return []
+    sketches = np.array(sketches)
+
+    # スケッチのチェビシェフ距離で候補ペアを探す
+    limit = threshold + 1e-6
+    candidates = []
+    for start in range(0, len(sketches), 32):
+        stop = min(start + 32, len(sketches))
+        dist = np.abs(sketches[start:stop, None, :] - sketches[None, :, :]).max(axis=2)
+        rows, cols = np.nonzero(dist <= limit)
+        rows += start
+        upper = rows < cols
+        candidates.extend(zip(rows[upper].tolist(), cols[upper].tolist()))
+
+    # 候補を全頂点で確認
+    delta_cache = {}
+    cache_limit = cache_bytes // (v_len * 3 * 4)
+
+    def get_delta(i):
+        delta = delta_cache.get(i)
+        if delta is None:
+            delta = read_delta(sketch_names[i])
+            if len(delta_cache) < cache_limit:
+                delta_cache[i] = delta
+        return delta
+
+    parent = list(range(len(sketch_names)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in candidates:
+        if find(a) == find(b):
+            continue
+        if np.abs(get_delta(a) - get_delta(b)).max() <= threshold:
+            parent[max(find(a), find(b))] = min(find(a), find(b))
+
+    groups = {}
+    for i, name in enumerate(sketch_names):
+        groups.setdefault(find(i), []).append(name)
+    return [group for group in groups.values() if len(group) > 1]
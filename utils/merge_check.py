@@ -0,0 +1,208 @@
+import numpy as np
+from bpy.types import Object
+from .key_stats import build_point_grid, query_point_grid
+
+# 閾値付近とみなす相対幅（この範囲は評価で確認する）
+MERGE_AMBIGUITY = 0.001
+
+# 頂点数を変えない変形モディファイア（マージの後ろにある場合のみ許可）
+DEFORM_MODIFIERS = {
+    "ARMATURE", "CAST", "CLOTH", "CORRECTIVE_SMOOTH", "CURVE", "DATA_TRANSFER", "DISPLACE", "HOOK",
+    "LAPLACIANSMOOTH", "LATTICE", "MESH_DEFORM", "NORMAL_EDIT", "SHRINKWRAP", "SIMPLE_DEFORM", "SMOOTH",
+    "SURFACE_DEFORM", "UV_PROJECT", "UV_WARP", "VERTEX_WEIGHT_EDIT", "VERTEX_WEIGHT_MIX",
+    "VERTEX_WEIGHT_PROXIMITY", "WARP", "WAVE", "WEIGHTED_NORMAL",
+} # fmt: skip
+
+
+def get_merge_stages(obj: Object):
+    """頂点数に影響するモディファイアを解析用のステージに変換する（解析できない構成は None）
+    MIRROR: ("MIRROR", axes, merge_threshold or None)
+    WELD: ("WELD", mode, merge_threshold)
+    """
+    stages = []
+    deform = False
+    for mod in obj.modifiers:
+        if not mod.show_viewport:
+            continue
+        if mod.type in DEFORM_MODIFIERS:
+            deform = True
+            continue
+        if deform or (stages and stages[-1][0] == "WELD"):
+            return None
+        if mod.type == "MIRROR":
+            axes = [i for i in range(3) if mod.use_axis[i]]
+            if mod.mirror_object or any(mod.use_bisect_axis[i] for i in axes):
+                return None
+            stages.append(("MIRROR", axes, mod.merge_threshold if mod.use_mirror_merge else None))
+        elif mod.type == "WELD":
+            if mod.vertex_group or mod.merge_threshold <= 0.0:
+                return None
+            if mod.mode == "CONNECTED" and stages:
+                return None
+            stages.append(("WELD", mod.mode, mod.merge_threshold))
+        else:
+            return None
+    return stages
+
+
+def _is_near(dist, threshold):
+    return bool(np.any(np.abs(dist - threshold) <= threshold * MERGE_AMBIGUITY))
+
+
+def _mirror_points(co, axes, threshold):
+    """ミラー後の座標を取得（マージされる頂点は複製しない）"""
+    for axis in axes:
+        flip = np.ones(3)
+        flip[axis] = -1.0
+        if threshold is None:
+            co = np.concatenate((co, co * flip))
+        else:
+            co = np.concatenate((co, co[np.abs(co[:, axis]) * 2.0 >= threshold] * flip))
+    return co
+
+
+def _mirror_count(co, stages):
+    for _, axes, threshold in stages:
+        co = _mirror_points(co, axes, threshold)
+    return len(co)
+
+
+def _weld_relation(pairs, threshold):
+    """近接ペアを (小さい方, 大きい方) の配列にする。閾値付近があれば None"""
+    query_indices, point_indices, dists = pairs
+    if _is_near(dists, threshold):
+        return None
+    keep = (dists < threshold) & (query_indices != point_indices)
+    a, b = query_indices[keep], point_indices[keep]
+    relation = np.stack((np.minimum(a, b), np.maximum(a, b)), axis=1)
+    return np.unique(relation, axis=0)
+
+
+def _compare_weld_all(co_b, co_k, moved, threshold, grid_b):
+    """動いた頂点に関わる近接ペアが Basis と同じか"""
+    radius = threshold * (1.0 + MERGE_AMBIGUITY)
+    moved_indices = np.flatnonzero(moved)
+
+    pairs_b = query_point_grid(grid_b, co_b[moved_indices], radius)
+    pairs_k = query_point_grid(grid_b, co_k[moved_indices], radius)
+    grid_m = build_point_grid(co_k[moved_indices], radius)
+    pairs_m = query_point_grid(grid_m, co_k[moved_indices], radius)
+    if pairs_b is None or pairs_k is None or pairs_m is None:
+        return False
+
+    q, p, d = pairs_b
+    relation_b = _weld_relation((moved_indices[q], p, d), threshold)
+    q, p, d = pairs_k
+    static = ~moved[p]
+    relation_k = _weld_relation(
+        (
+            np.concatenate((moved_indices[q[static]], moved_indices[pairs_m[0]])),
+            np.concatenate((p[static], moved_indices[pairs_m[1]])),
+            np.concatenate((d[static], pairs_m[2])),
+        ),
+        threshold,
+    )
+    if relation_b is None or relation_k is None:
+        return False
+    return relation_b.shape == relation_k.shape and bool(np.all(relation_b == relation_k))
+
+
+def _compare_weld_connected(co_b, co_k, moved, threshold, edges):
+    """動いた頂点に接する辺の長さが閾値をまたがないか"""
+    edges = edges[moved[edges[:, 0]] | moved[edges[:, 1]]]
+    len_b = np.linalg.norm(co_b[edges[:, 0]] - co_b[edges[:, 1]], axis=1)
+    len_k = np.linalg.norm(co_k[edges[:, 0]] - co_k[edges[:, 1]], axis=1)
+    if _is_near(len_b, threshold) or _is_near(len_k, threshold):
+        return False
+    return bool(np.all((len_b < threshold) == (len_k < threshold)))
+
+
+def _classify_key(co_b, co_k, stages, edges, grid_cache):
+    """"OK" / "ERROR" / "AMBIGUOUS" を返す"""
+    moved = np.any(co_b != co_k, axis=1)
+    if not moved.any():
+        return "OK"
+
+    for i, stage in enumerate(stages):
+        if stage[0] == "MIRROR":
+            _, axes, threshold = stage
+            for j, axis in enumerate(axes):
+                flip = np.ones(3)
+                flip[axis] = -1.0
+                if threshold is None:
+                    keep_b = keep_k = np.ones(len(co_b), dtype=bool)
+                else:
+                    dist_b = np.abs(co_b[:, axis]) * 2.0
+                    dist_k = np.abs(co_k[:, axis]) * 2.0
+                    if _is_near(dist_k[moved], threshold) or _is_near(dist_b[moved], threshold):
+                        return "AMBIGUOUS"
+                    keep_b = dist_b >= threshold
+                    keep_k = dist_k >= threshold
+                if np.any(keep_b != keep_k):
+                    if any(s[0] == "WELD" for s in stages[i:]):
+                        return "AMBIGUOUS"
+                    # ミラーのみの場合は頂点数を直接比較できる
+                    rest = [("MIRROR", axes[j + 1 :], threshold)] + stages[i + 1 :]
+                    count_b = _mirror_count(np.concatenate((co_b, co_b[keep_b] * flip)), rest)
+                    count_k = _mirror_count(np.concatenate((co_k, co_k[keep_k] * flip)), rest)
+                    return "OK" if count_b == count_k else "ERROR"
+                co_b = np.concatenate((co_b, co_b[keep_b] * flip))
+                co_k = np.concatenate((co_k, co_k[keep_k] * flip))
+                moved = np.concatenate((moved, moved[keep_k]))
+
+        elif stage[1] == "CONNECTED":
+            if not _compare_weld_connected(co_b, co_k, moved, stage[2], edges):
+                return "AMBIGUOUS"
+
+        else:
+            threshold = stage[2]
+            grid_b = grid_cache.get(i)
+            if grid_b is None:
+                grid_b = grid_cache[i] = build_point_grid(co_b, threshold * (1.0 + MERGE_AMBIGUITY))
+            if not _compare_weld_all(co_b, co_k, moved, threshold, grid_b):
+                return "AMBIGUOUS"
+
+    return "OK"
+
+
+def classify_merge_keys(obj: Object, names, stages) -> tuple[set[str], set[str]]:
+    """モディファイアのマージで Basis と頂点数が変わるキーを判定する (errors, ambiguous)
+    ambiguous は閾値付近などで判定できないキー（モディファイアの評価で確認する）
+    """
+    shape_keys = obj.data.shape_keys
+    key_blocks = shape_keys.key_blocks
+    basis_kb = shape_keys.reference_key
+    v_len = len(basis_kb.data)
+
+    co_buf = np.empty(v_len * 3, dtype=np.float32)
+    basis_kb.data.foreach_get("co", co_buf)
+    basis_co = co_buf.astype(np.float64).reshape(-1, 3)
+
+    edges = None
+    if any(stage[0] == "WELD" and stage[1] == "CONNECTED" for stage in stages):
+        edges = np.empty(len(obj.data.edges) * 2, dtype=np.int32)
+        obj.data.edges.foreach_get("vertices", edges)
+        edges = edges.reshape(-1, 2)
+
+    relative_co = {basis_kb.name: basis_co}
+    grid_cache = {}
+    errors, ambiguous = set(), set()
+    for name in names:
+        kb = key_blocks[name]
+        if kb.vertex_group or not kb.slider_min <= 1.0 <= kb.slider_max:
+            ambiguous.add(name)
+            continue
+        rel_kb = kb.relative_key
+        rel_co = relative_co.get(rel_kb.name)
+        if rel_co is None:
+            rel_kb.data.foreach_get("co", co_buf)
+            rel_co = relative_co[rel_kb.name] = co_buf.astype(np.float64).reshape(-1, 3)
+        kb.data.foreach_get("co", co_buf)
+        key_co = basis_co + (co_buf.reshape(-1, 3) - rel_co)
+
+        result = _classify_key(basis_co, key_co, stages, edges, grid_cache)
+        if result == "ERROR":
+            errors.add(name)
+        elif result == "AMBIGUOUS":
+            ambiguous.add(name)
+    return errors, ambiguous
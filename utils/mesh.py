@@ -1,47 +1,169 @@
+import bpy
+import bmesh
+import heapq
+import zlib
+import numpy as np
 from mathutils import kdtree
+from .key_stats import build_x_mirror_pairs
 
 
-def find_x_mirror_verts(bm, selected_verts):
-    """X軸に対称な頂点を見つける"""
-    kd = kdtree.KDTree(len(bm.verts))
-    for i, v in enumerate(bm.verts):
-        kd.insert(v.co, i)
-    kd.balance()
-
-    mirror_verts = set()
-    for v in selected_verts:
-        mirror_co = v.co.copy()
-        mirror_co.x = -mirror_co.x
-        _, index, dist = kd.find(mirror_co)
-        if dist < 0.0001:
-            mirror_vert = bm.verts[index]
-            if mirror_vert not in selected_verts:
-                mirror_verts.add(mirror_vert)
-
-    return mirror_verts
-
-
-def find_x_mirror_vert_pairs(bm, selected_verts) -> dict:
-    """X軸に対称な頂点のペアを見つける"""
-    kd = kdtree.KDTree(len(bm.verts))
-    for i, v in enumerate(bm.verts):
-        kd.insert(v.co, i)
-    kd.balance()
-
-    mirror_verts = {}
-    for v in selected_verts:
-        result = None
-        mirror_co = v.co.copy()
-        mirror_co.x = -mirror_co.x
-        _, index, dist = kd.find(mirror_co)
-        if dist < 0.0001:
-            mirror_vert = bm.verts[index]
-            if mirror_vert not in selected_verts:
-                result = mirror_vert
-
-        mirror_verts[v] = result
-
-    return mirror_verts
+# {session_uid: (v_len, basis_hash, mirror_table)}
+_x_mirror_cache = {}
+
+X_MIRROR_TOLERANCE = 0.0001
+
+
+def _build_x_mirror_table(co):
+    pair_indices, mirror_indices = build_x_mirror_pairs(co, X_MIRROR_TOLERANCE)
+    table = np.full(len(co), -1, dtype=np.int32)
+    table[pair_indices] = mirror_indices
+    return table
+
+
+def get_x_mirror_table(obj) -> np.ndarray:
+    """Basisに基づくX軸の対称頂点のテーブル（対称な頂点がない場合は -1）
+    頂点数とBasisが変わらない限りキャッシュを使う。編集モードでは事前に update_from_editmode しておく
+    """
+    mesh = obj.data
+    v_len = len(mesh.vertices)
+    co = np.empty(v_len * 3, dtype=np.float32)
+    if mesh.shape_keys:
+        mesh.shape_keys.reference_key.data.foreach_get("co", co)
+    else:
+        mesh.vertices.foreach_get("co", co)
+    basis_hash = zlib.crc32(co)
+
+    cached = _x_mirror_cache.get(obj.session_uid)
+    if cached is not None and cached[0] == v_len and cached[1] == basis_hash:
+        return cached[2]
+
+    table = _build_x_mirror_table(co.reshape(-1, 3))
+    _x_mirror_cache[obj.session_uid] = (v_len, basis_hash, table)
+    return table
+
+
+def mirror_mask_x(obj, mask) -> np.ndarray:
+    """mask に X軸の対称頂点を追加したマスク"""
+    table = get_x_mirror_table(obj)
+    mirror = table[mask]
+    result = mask.copy()
+    result[mirror[mirror >= 0]] = True
+    return result
+
+
+def calc_side_weights(x, radius=0.0):
+    """X座標から左右のウェイト (weight_l, weight_r) を計算（合計は常に1）
+    radius > 0 の場合は -radius〜radius を smoothstep で補間する
+    """
+    if radius <= 0.0:
+        is_pos = x > np.float32(0.0)
+        is_neg = x < np.float32(0.0)
+        is_center = ~(is_pos | is_neg)
+        weight_l = is_pos.astype(np.float32) + is_center.astype(np.float32) * np.float32(0.5)
+        weight_r = is_neg.astype(np.float32) + is_center.astype(np.float32) * np.float32(0.5)
+    else:
+        radius_f = np.float32(radius)
+        t = (x + radius_f) / (np.float32(2.0) * radius_f)
+        t = np.clip(t, np.float32(0.0), np.float32(1.0))
+        weight_l = t * t * (np.float32(3.0) - np.float32(2.0) * t)
+        weight_r = np.float32(1.0) - weight_l
+    return weight_l, weight_r
+
+
+def get_vertex_group_weights(obj, group_names) -> dict:
+    """頂点グループのウェイトを配列で取得 {name: weights}（頂点の走査は1回）"""
+    v_len = len(obj.data.vertices)
+    vertex_groups = obj.vertex_groups
+    index_map = {vertex_groups[name].index: name for name in group_names if name in vertex_groups}
+    weights = {name: np.zeros(v_len, dtype=np.float32) for name in index_map.values()}
+    if not index_map:
+        return weights
+    for v in obj.data.vertices:
+        for g in v.groups:
+            name = index_map.get(g.group)
+            if name is not None:
+                weights[name][v.index] = g.weight
+    return weights
+
+
+def find_region_boundary(edges, mask):
+    """mask 内の頂点のうち、mask 外の頂点と辺でつながる頂点のマスク"""
+    boundary = np.zeros(len(mask), dtype=bool)
+    inside = mask[edges]
+    cross = inside[:, 0] != inside[:, 1]
+    boundary[edges[cross][inside[cross]]] = True
+    return boundary
+
+
+def calc_boundary_distance(co, edges, mask, geodesic=False):
+    """mask 内の各頂点から境界頂点までの距離（境界は 0、到達できない頂点は inf）
+    geodesic は mask 内の辺をたどった距離（Dijkstra 法）
+    """
+    v_len = len(co)
+    boundary = find_region_boundary(edges, mask)
+    distances = np.full(v_len, np.inf)
+    distances[boundary] = 0.0
+    boundary_indices = np.flatnonzero(boundary)
+    interior_indices = np.flatnonzero(mask & ~boundary)
+    if not len(boundary_indices) or not len(interior_indices):
+        return distances
+
+    if not geodesic:
+        kd = kdtree.KDTree(len(boundary_indices))
+        for i, c in zip(boundary_indices.tolist(), co[boundary_indices].tolist()):
+            kd.insert(c, i)
+        kd.balance()
+        distances[interior_indices] = [kd.find(c)[2] for c in co[interior_indices].tolist()]
+        return distances
+
+    # mask 内の辺の隣接リスト (CSR)
+    edges = edges[mask[edges[:, 0]] & mask[edges[:, 1]]]
+    rows = np.concatenate((edges[:, 0], edges[:, 1]))
+    cols = np.concatenate((edges[:, 1], edges[:, 0]))
+    order = np.argsort(rows, kind="stable")
+    rows, cols = rows[order], cols[order]
+    lengths = np.linalg.norm(co[rows] - co[cols], axis=1).tolist()
+    offsets = np.searchsorted(rows, np.arange(v_len + 1)).tolist()
+    cols = cols.tolist()
+
+    dist = distances.tolist()
+    heap = [(0.0, i) for i in boundary_indices.tolist()]
+    while heap:
+        d, i = heapq.heappop(heap)
+        if d > dist[i]:
+            continue
+        for k in range(offsets[i], offsets[i + 1]):
+            j = cols[k]
+            nd = d + lengths[k]
+            if nd < dist[j]:
+                dist[j] = nd
+                heapq.heappush(heap, (nd, j))
+    return np.array(dist)
+
+
+def select_verts_by_mask(obj, mask, add=False):
+    """編集モードの頂点選択を mask に合わせる
+    全選択/全解除を先に行い、それと異なる頂点だけを書き込む
+    """
+    if add:
+        value = True
+        indices = np.flatnonzero(mask)
+    else:
+        value = np.count_nonzero(mask) * 2 <= len(mask)
+        bpy.ops.mesh.select_all(action="DESELECT" if value else "SELECT")
+        indices = np.flatnonzero(mask == value)
+
+    bm = bmesh.from_edit_mesh(obj.data)
+    bm.verts.ensure_lookup_table()
+    verts = bm.verts
+    for i in indices.tolist():
+        v = verts[i]
+        # select_all と同じく非表示の頂点は選択しない
+        if value and v.hide:
+            continue
+        v.select = value
+    bm.select_flush_mode()
+    bmesh.update_edit_mesh(obj.data)
 
 
 # def create_selection_mask(obj, is_edit, mirror=True):
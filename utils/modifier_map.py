@@ -0,0 +1,286 @@
+import numpy as np
+from bpy.types import Object
+from mathutils import kdtree
+from mathutils.bvhtree import BVHTree
+
+# 線形化を検証するときの許容誤差（座標の大きさに対する比率）
+LINEAR_MAP_TOLERANCE = 0.00001
+
+
+def _mirror_stage(src, flip, offset, mod):
+    if mod.use_mirror_merge or mod.mirror_object:
+        return None
+    for axis in range(3):
+        if not mod.use_axis[axis]:
+            continue
+        if mod.use_bisect_axis[axis]:
+            return None
+        axis_flip = np.ones(3, dtype=np.float32)
+        axis_flip[axis] = -1.0
+        src = np.concatenate((src, src))
+        flip = np.concatenate((flip, flip * axis_flip))
+        offset = np.concatenate((offset, offset * axis_flip))
+    return src, flip, offset
+
+
+def _array_stage(src, flip, offset, mod):
+    # 相対オフセットは形状のバウンディングボックスに依存するため線形ではない
+    if (
+        mod.fit_type != "FIXED_COUNT"
+        or mod.use_relative_offset
+        or mod.use_object_offset
+        or mod.use_merge_vertices
+        or mod.start_cap
+        or mod.end_cap
+    ):
+        return None
+    if not mod.use_constant_offset:
+        step = np.zeros(3, dtype=np.float32)
+    else:
+        step = np.array(mod.constant_offset_displace, dtype=np.float32)
+    count = mod.count
+    src = np.tile(src, count)
+    flip = np.tile(flip, (count, 1))
+    offset = np.concatenate([offset + step * i for i in range(count)])
+    return src, flip, offset
+
+
+LINEAR_STAGES = {
+    "MIRROR": _mirror_stage,
+    "ARRAY": _array_stage,
+}
+
+
+def get_linear_modifier_map(obj: Object, v_len):
+    """モディファイアの結果を 頂点の対応 + 軸ごとの反転 + 平行移動 で表す (src, flip, offset)
+    out = co[src] * flip + offset
+    線形化できないモディファイアが含まれる場合は None
+    """
+    src = np.arange(v_len, dtype=np.int32)
+    flip = np.ones((v_len, 3), dtype=np.float32)
+    offset = np.zeros((v_len, 3), dtype=np.float32)
+    for mod in obj.modifiers:
+        if not mod.show_viewport:
+            continue
+        stage = LINEAR_STAGES.get(mod.type)
+        if stage is None:
+            return None
+        result = stage(src, flip, offset, mod)
+        if result is None:
+            return None
+        src, flip, offset = result
+    return src, flip, offset
+
+
+def validate_linear_map(linear_map, basis_co, applied_co):
+    """適用後のBasisと線形化の結果が一致するか"""
+    src, flip, offset = linear_map
+    if len(src) != len(applied_co):
+        return False
+    predicted = basis_co[src] * flip + offset
+    scale = max(float(np.abs(applied_co).max(initial=0.0)), 1.0)
+    return bool(np.abs(predicted - applied_co).max(initial=0.0) <= scale * LINEAR_MAP_TOLERANCE)
+
+
+def apply_linear_map(linear_map, applied_basis_co, delta):
+    """キーの差分を適用後のメッシュに変換"""
+    src, flip, _ = linear_map
+    return applied_basis_co + delta[src] * flip
+
+
+ORIGINDEX_ATTR = "mio3sk_origindex"
+
+# 応答を求めるときの拡大率と、対称面からの最小距離（座標の大きさに対する比率）
+JACOBIAN_EPSILON = 0.001
+JACOBIAN_MIN_DIST = 0.01
+
+
+def _index_hash(indices):
+    """頂点番号の検証用の値（補間された値と区別するため非線形な2つの値）"""
+    indices = np.asarray(indices, dtype=np.float64)
+    h1 = np.modf(np.abs(np.sin(indices * 12.9898 + 1.0)) * 43758.5453)[0]
+    h2 = np.modf(np.abs(np.sin(indices * 78.233 + 2.0)) * 24634.6345)[0]
+    return np.stack((h1, h2), axis=-1).astype(np.float32)
+
+
+def _read_eval_co(context, obj: Object):
+    depsgraph = context.evaluated_depsgraph_get()
+    eval_obj = obj.evaluated_get(depsgraph)
+    eval_mesh = eval_obj.to_mesh()
+    co = np.empty(len(eval_mesh.vertices) * 3, dtype=np.float32)
+    eval_mesh.vertices.foreach_get("co", co)
+    code = None
+    attr = eval_mesh.attributes.get(ORIGINDEX_ATTR)
+    if attr and attr.data_type == "FLOAT_VECTOR" and attr.domain == "POINT":
+        code = np.empty(len(eval_mesh.vertices) * 3, dtype=np.float32)
+        attr.data.foreach_get("vector", code)
+        code = code.reshape(-1, 3)
+    eval_obj.to_mesh_clear()
+    return co.reshape(-1, 3), code
+
+
+def _decode_origindex(code, src_len):
+    """属性から元の頂点番号を復元（補間された値は -1）"""
+    if code is None:
+        return None
+    index = np.rint(code[:, 0])
+    valid = (np.abs(code[:, 0] - index) < 0.001) & (index >= 0) & (index < src_len)
+    index = np.where(valid, index, 0).astype(np.int64)
+    valid &= np.all(np.abs(code[:, 1:] - _index_hash(index)) < 0.0001, axis=1)
+    return np.where(valid, index, -1)
+
+
+def _nearest_surface_weights(src_co, tris, query_co):
+    """元のメッシュの最も近い面上の点を、三角形の頂点と重心座標 (indices, weights) で表す"""
+    if not len(tris):
+        kd = kdtree.KDTree(len(src_co))
+        for i, c in enumerate(src_co.tolist()):
+            kd.insert(c, i)
+        kd.balance()
+        indices = np.array([kd.find(c)[1] for c in query_co.tolist()], dtype=np.int64)
+        return indices[:, None], np.ones((len(query_co), 1), dtype=np.float32)
+
+    bvh = BVHTree.FromPolygons(src_co.tolist(), tris.tolist(), all_triangles=True)
+    locations = np.empty((len(query_co), 3), dtype=np.float64)
+    tri_indices = np.empty(len(query_co), dtype=np.int64)
+    for i, c in enumerate(query_co.tolist()):
+        location, _, index, _ = bvh.find_nearest(c)
+        locations[i] = location
+        tri_indices[i] = index
+
+    indices = tris[tri_indices].astype(np.int64)
+    a, b, c = (src_co[indices[:, k]].astype(np.float64) for k in range(3))
+    v0, v1, v2 = b - a, c - a, locations - a
+    d00 = np.einsum("ij,ij->i", v0, v0)
+    d01 = np.einsum("ij,ij->i", v0, v1)
+    d11 = np.einsum("ij,ij->i", v1, v1)
+    d20 = np.einsum("ij,ij->i", v2, v0)
+    d21 = np.einsum("ij,ij->i", v2, v1)
+    denom = d00 * d11 - d01 * d01
+    safe = np.abs(denom) > 1e-20
+    denom = np.where(safe, denom, 1.0)
+    v = np.where(safe, (d11 * d20 - d01 * d21) / denom, 0.0)
+    w = np.where(safe, (d00 * d21 - d01 * d20) / denom, 0.0)
+    weights = np.clip(np.stack((1.0 - v - w, v, w), axis=1), 0.0, 1.0)
+    weights /= np.maximum(weights.sum(axis=1, keepdims=True), 1e-12)
+    return indices, weights.astype(np.float32)
+
+
+def _find_nearest(co, candidates, query_co):
+    kd = kdtree.KDTree(len(candidates))
+    for i, c in zip(candidates.tolist(), co[candidates].tolist()):
+        kd.insert(c, i)
+    kd.balance()
+    return [kd.find(c)[1] for c in query_co.tolist()]
+
+
+def _probe_jacobian(context, obj: Object, src_co, eval_co, mapping):
+    """軸ごとに原点を中心に拡大したときの各頂点の応答（ミラーの反転など）
+    対称面上の頂点は動かないため、ミラーのマージの状態は変わらない。頂点数が変わる場合は None
+    対称面に近い頂点は応答が求まらないため、向きが同じで最も近い頂点の値を使う
+    """
+    rows, cols, weights = mapping
+    mesh = obj.data
+    basis_kb = mesh.shape_keys.reference_key
+    v_len = len(eval_co)
+
+    source_co = np.empty((v_len, 3), dtype=np.float64)
+    for axis in range(3):
+        source_co[:, axis] = np.bincount(rows, weights=src_co[cols, axis] * weights, minlength=v_len)
+    min_dist = max(float(np.ptp(src_co, axis=0).max(initial=0.0)), 1e-6) * JACOBIAN_MIN_DIST
+
+    jacobian = np.broadcast_to(np.eye(3, dtype=np.float32), (v_len, 3, 3)).copy()
+    try:
+        for axis in range(3):
+            scaled = src_co.copy()
+            scaled[:, axis] *= 1.0 + JACOBIAN_EPSILON
+            basis_kb.data.foreach_set("co", scaled.ravel())
+            mesh.update()
+            probe_co, _ = _read_eval_co(context, obj)
+            if len(probe_co) != v_len:
+                return None
+
+            offset = source_co[:, axis]
+            valid = np.abs(offset) > min_dist
+            if not valid.any():
+                continue
+            column = np.zeros((v_len, 3), dtype=np.float32)
+            column[valid] = (probe_co[valid] - eval_co[valid]) / (JACOBIAN_EPSILON * offset[valid, None])
+            # 近い頂点のうち、向き（元の頂点との符号の関係）が同じ頂点の値を使う
+            orientation = np.sign(eval_co[:, axis]) * np.sign(offset)
+            for side in (-1.0, 1.0, 0.0):
+                invalid = np.flatnonzero(~valid & (orientation == side))
+                if not len(invalid):
+                    continue
+                candidates = np.flatnonzero(valid & (orientation == side)) if side else np.empty(0, dtype=np.int64)
+                if not len(candidates):
+                    candidates = np.flatnonzero(valid)
+                column[invalid] = column[_find_nearest(eval_co, candidates, eval_co[invalid])]
+            jacobian[:, :, axis] = column
+    finally:
+        basis_kb.data.foreach_set("co", src_co.ravel())
+        mesh.update()
+    return jacobian
+
+
+def build_correspondence(context, obj: Object, v_len):
+    """モディファイア適用後の頂点と適用前の頂点の対応を作成 (rows, cols, weights, jacobian)
+    頂点番号の属性が残る頂点はその頂点、残らない頂点は最も近い面に対応させる
+    jacobian は差分に対する各頂点の応答（ミラーの反転など）
+    obj はシェイプキーの値がすべて0の作業用オブジェクト。評価後の頂点数が v_len と異なる場合は None
+    """
+    mesh = obj.data
+    basis_kb = mesh.shape_keys.reference_key
+    src_len = len(mesh.vertices)
+
+    indices = np.arange(src_len)
+    code = np.zeros((src_len, 3), dtype=np.float32)
+    code[:, 0] = indices
+    code[:, 1:] = _index_hash(indices)
+    attr = mesh.attributes.get(ORIGINDEX_ATTR) or mesh.attributes.new(ORIGINDEX_ATTR, "FLOAT_VECTOR", "POINT")
+    attr.data.foreach_set("vector", code.ravel())
+    mesh.update()
+
+    eval_co, eval_code = _read_eval_co(context, obj)
+    mesh.attributes.remove(mesh.attributes[ORIGINDEX_ATTR])
+    if len(eval_co) != v_len:
+        return None
+
+    src_co = np.empty(src_len * 3, dtype=np.float32)
+    basis_kb.data.foreach_get("co", src_co)
+    src_co = src_co.reshape(-1, 3)
+
+    origindex = _decode_origindex(eval_code, src_len)
+    if origindex is None:
+        origindex = np.full(v_len, -1, dtype=np.int64)
+    mapped = origindex >= 0
+    rows = [np.flatnonzero(mapped)]
+    cols = [origindex[mapped]]
+    weights = [np.ones(len(rows[0]), dtype=np.float32)]
+
+    unmapped = np.flatnonzero(~mapped)
+    if len(unmapped):
+        mesh.calc_loop_triangles()
+        tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("vertices", tris)
+        near_indices, near_weights = _nearest_surface_weights(src_co, tris.reshape(-1, 3), eval_co[unmapped])
+        rows.append(np.repeat(unmapped, near_indices.shape[1]))
+        cols.append(near_indices.ravel())
+        weights.append(near_weights.ravel())
+
+    rows, cols, weights = np.concatenate(rows), np.concatenate(cols), np.concatenate(weights)
+
+    jacobian = _probe_jacobian(context, obj, src_co, eval_co, (rows, cols, weights))
+    if jacobian is None:
+        return None
+    return rows, cols, weights, jacobian
+
+
+def apply_correspondence(correspondence, applied_basis_co, delta):
+    """キーの差分を対応を使って適用後のメッシュに変換"""
+    rows, cols, weights, jacobian = correspondence
+    v_len = len(applied_basis_co)
+    mapped = np.empty((v_len, 3), dtype=np.float32)
+    for axis in range(3):
+        mapped[:, axis] = np.bincount(rows, weights=delta[cols, axis] * weights, minlength=v_len)
+    return applied_basis_co + np.einsum("nij,nj->ni", jacobian, mapped)
@@ -0,0 +1,153 @@
+import zlib
+import numpy as np
+from bpy.types import Object
+
+# {session_uid: {"topology": (v_len, edges_hash), "operators": {kind: (geometry_key, operator)}}}
+_smooth_cache = {}
+
+# Taubin 法の通過帯域と λ の上限（発散しない範囲）
+TAUBIN_PASS_BAND = 0.1
+TAUBIN_MAX_LAMBDA = 0.5
+
+
+def get_mesh_edges(obj: Object) -> np.ndarray:
+    edges = np.empty(len(obj.data.edges) * 2, dtype=np.int32)
+    obj.data.edges.foreach_get("vertices", edges)
+    return edges.reshape(-1, 2)
+
+
+def build_uniform_operator(edges, v_len):
+    """隣接頂点の平均を求める疎行列 (rows, cols, weights, row_sum)"""
+    rows = np.concatenate((edges[:, 0], edges[:, 1]))
+    cols = np.concatenate((edges[:, 1], edges[:, 0]))
+    weights = np.ones(len(rows))
+    row_sum = np.bincount(rows, weights=weights, minlength=v_len)
+    return rows, cols, weights, row_sum
+
+
+def get_mesh_triangles(obj: Object) -> np.ndarray:
+    mesh = obj.data
+    mesh.calc_loop_triangles()
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+    return tris.reshape(-1, 3)
+
+
+def build_cotangent_operator(edges, tris, co):
+    """コタンジェント重みの疎行列（負の重みは0、面のない辺には小さな重みを与える）"""
+    v_len = len(co)
+    co = np.asarray(co, dtype=np.float64)
+    rows, cols, weights = [], [], []
+    for a, b, c in ((0, 1, 2), (1, 2, 0), (2, 0, 1)):
+        i, j, k = tris[:, a], tris[:, b], tris[:, c]
+        u = co[i] - co[k]
+        v = co[j] - co[k]
+        cross = np.linalg.norm(np.cross(u, v), axis=1)
+        cot = np.einsum("ij,ij->i", u, v) / np.maximum(cross, 1e-12)
+        w = np.maximum(cot * 0.5, 0.0)
+        rows += [i, j]
+        cols += [j, i]
+        weights += [w, w]
+
+    positive = np.concatenate(weights) if weights else np.empty(0)
+    positive = positive[positive > 0]
+    epsilon = (positive.mean() if len(positive) else 1.0) * 0.001
+
+    # 面のない辺
+    tri_edges = np.concatenate((tris[:, [0, 1]], tris[:, [1, 2]], tris[:, [2, 0]])).astype(np.int64)
+    tri_keys = np.min(tri_edges, axis=1) * v_len + np.max(tri_edges, axis=1)
+    edge_keys = np.min(edges, axis=1).astype(np.int64) * v_len + np.max(edges, axis=1)
+    loose = edges[~np.isin(edge_keys, tri_keys)]
+    rows += [loose[:, 0], loose[:, 1]]
+    cols += [loose[:, 1], loose[:, 0]]
+    weights += [np.full(len(loose), epsilon)] * 2
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    weights = np.concatenate(weights)
+    row_sum = np.bincount(rows, weights=weights, minlength=v_len)
+    return rows, cols, weights, row_sum
+
+
+def get_smooth_operator(obj: Object, edges, kind="UNIFORM", co=None):
+    """トポロジーごとにキャッシュしたスムーズ用の演算子を取得
+    COTANGENT は co（形状）にも依存するため、形状が変わった場合は作り直す
+    """
+    v_len = len(obj.data.vertices)
+    topology = (v_len, zlib.crc32(edges))
+    cache = _smooth_cache.get(obj.session_uid)
+    if cache is None or cache["topology"] != topology:
+        cache = {"topology": topology, "operators": {}}
+        _smooth_cache[obj.session_uid] = cache
+
+    tris = None
+    geometry_key = None
+    if kind == "COTANGENT":
+        tris = get_mesh_triangles(obj)
+        geometry_key = (zlib.crc32(tris), zlib.crc32(np.ascontiguousarray(co, dtype=np.float32)))
+
+    cached = cache["operators"].get(kind)
+    if cached is not None and cached[0] == geometry_key:
+        return cached[1]
+
+    if kind == "COTANGENT":
+        operator = build_cotangent_operator(edges, tris, co)
+    else:
+        operator = build_uniform_operator(edges, v_len)
+    cache["operators"][kind] = (geometry_key, operator)
+    return operator
+
+
+def restrict_operator(operator, indices):
+    """指定した頂点の行だけを残す"""
+    rows, cols, weights, row_sum = operator
+    mask = np.zeros(len(row_sum), dtype=bool)
+    mask[indices] = True
+    keep = mask[rows]
+    return rows[keep], cols[keep], weights[keep], row_sum
+
+
+def apply_operator(operator, values):
+    """重み付きの隣接平均を計算（隣接のない頂点はそのまま）"""
+    rows, cols, weights, row_sum = operator
+    v_len = len(row_sum)
+    result = np.empty_like(values)
+    for axis in range(3):
+        result[:, axis] = np.bincount(rows, weights=values[cols, axis] * weights, minlength=v_len)
+    valid = row_sum > 0
+    result[valid] /= row_sum[valid, None]
+    result[~valid] = values[~valid]
+    return result
+
+
+def calc_taubin_mu(factors):
+    """Taubin 法の収縮を打ち消す負の係数 μ = 1 / (k_pb - 1 / λ)"""
+    mu = np.zeros_like(factors)
+    valid = factors > 0
+    mu[valid] = 1.0 / (TAUBIN_PASS_BAND - 1.0 / factors[valid])
+    return mu
+
+
+def smooth_field(values, operator, indices, factors, iterations, taubin=False, tolerance=0.0):
+    """indices の頂点を隣接平均に向けて factors の割合で移動する（Jacobi 法）
+    taubin は λ/μ の2段階で収縮を抑える。tolerance を指定すると1回の移動量が下回った時点で止める
+    (values, 実行した回数) を返す
+    """
+    values = values.copy()
+    operator = restrict_operator(operator, indices)
+    if taubin:
+        factors = factors * TAUBIN_MAX_LAMBDA
+        steps = [factors, calc_taubin_mu(factors)]
+    else:
+        steps = [factors]
+
+    count = 0
+    for _ in range(iterations):
+        before = values[indices]
+        for step in steps:
+            average = apply_operator(operator, values)
+            values[indices] += (average[indices] - values[indices]) * step[:, None]
+        count += 1
+        if tolerance > 0.0 and np.abs(values[indices] - before).max() < tolerance:
+            break
+    return values, count
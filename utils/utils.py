@@ -1,4 +1,5 @@
 import bpy
+from bisect import bisect_left
 
 
 def is_obj(obj):
@@ -53,38 +54,54 @@ def move_shape_key_below(obj, anchor_idx, target_idx):
     clear_shape_keys_selection(key_blocks)
 
     if count < 2:
-        return
+        return 0
     if anchor_idx < 0 or target_idx < 0:
-        return
+        return 0
     if anchor_idx >= count or target_idx >= count:
-        return
+        return 0
 
     if target_idx == anchor_idx:
-        return
+        return 0
 
     if target_idx < anchor_idx:
         destination = anchor_idx
     else:
         destination = anchor_idx + 1
 
-    destination = max(1, min(destination, count - 1))
-    if destination == target_idx:
-        return
+    return move_shape_key_to(obj, target_idx, destination)
 
-    obj.active_shape_key_index = target_idx
 
+def _move_cost(count, target_idx, destination):
+    """move_shape_key_to の shape_key_move の呼び出し回数と方法 (cost, method)"""
     direct_moves = abs(target_idx - destination)
     top_moves = destination
     bottom_moves = count - destination
-
     if direct_moves <= min(top_moves, bottom_moves):
+        return direct_moves, "DIRECT"
+    elif top_moves <= bottom_moves:
+        return top_moves, "TOP"
+    else:
+        return bottom_moves, "BOTTOM"
+
+
+def move_shape_key_to(obj, target_idx, destination):
+    """target_idx のシェイプキーを最小の移動回数で destination に移動し、移動回数を返す"""
+    count = len(obj.data.shape_keys.key_blocks)
+    destination = max(1, min(destination, count - 1))
+    if destination == target_idx:
+        return 0
+
+    obj.active_shape_key_index = target_idx
+
+    moves, method = _move_cost(count, target_idx, destination)
+    if method == "DIRECT":
         if target_idx > destination:
             for _ in range(target_idx - destination):
                 bpy.ops.object.shape_key_move(type="UP")
         else:
             for _ in range(destination - target_idx):
                 bpy.ops.object.shape_key_move(type="DOWN")
-    elif top_moves <= bottom_moves:
+    elif method == "TOP":
         bpy.ops.object.shape_key_move(type="TOP")
         for _ in range(destination - 1):
             bpy.ops.object.shape_key_move(type="DOWN")
@@ -92,6 +109,94 @@ def move_shape_key_below(obj, anchor_idx, target_idx):
         bpy.ops.object.shape_key_move(type="BOTTOM")
         for _ in range((count - 1) - destination):
             bpy.ops.object.shape_key_move(type="UP")
+    return moves
+
+
+def longest_increasing_subsequence(seq):
+    """最長増加部分列のインデックスを返す"""
+    tails = []
+    tails_idx = []
+    prev = [-1] * len(seq)
+    for i, value in enumerate(seq):
+        pos = bisect_left(tails, value)
+        if pos == len(tails):
+            tails.append(value)
+            tails_idx.append(i)
+        else:
+            tails[pos] = value
+            tails_idx[pos] = i
+        prev[i] = tails_idx[pos - 1] if pos > 0 else -1
+
+    result = []
+    i = tails_idx[-1] if tails_idx else -1
+    while i != -1:
+        result.append(i)
+        i = prev[i]
+    result.reverse()
+    return result
+
+
+def _plan_reorder(current_names, target_names, keep):
+    """keep 以外のキーを順に移動する計画 [(name, destination)] と、shape_key_move の呼び出し回数"""
+    names = ["Basis"] + list(current_names)
+    count = len(names)
+    plan = []
+    cost = 0
+    prev_name = None
+    for name in target_names:
+        if name not in keep:
+            target_idx = names.index(name)
+            if prev_name is None:
+                destination = 1
+            else:
+                prev_idx = names.index(prev_name)
+                destination = prev_idx if target_idx < prev_idx else prev_idx + 1
+            if destination != target_idx:
+                cost += _move_cost(count, target_idx, destination)[0]
+                names.insert(destination, names.pop(target_idx))
+                plan.append((name, destination))
+        prev_name = name
+    return plan, cost
+
+
+def reorder_shape_keys(obj, sorted_names):
+    """Basis以外のシェイプキーを sorted_names の順に並び替え、shape_key_move の呼び出し回数を返す
+    既に相対順序が正しいキー（最長増加部分列）は動かさず、残りのキーだけを移動する
+    その方が呼び出し回数が多くなる場合は、最初に位置が異なるキーから順に最後尾に移動する
+    """
+    key_blocks = obj.data.shape_keys.key_blocks
+    current_names = key_blocks.keys()[1:]
+    current_set = set(current_names)
+    target_names = [name for name in dict.fromkeys(sorted_names) if name in current_set]
+    target_pos = {name: i for i, name in enumerate(target_names)}
+
+    # 並び順の指定がないキーは末尾に現在の順で残す
+    for name in current_names:
+        if name not in target_pos:
+            target_pos[name] = len(target_names)
+            target_names.append(name)
+
+    seq = [target_pos[name] for name in current_names]
+    keep = {current_names[i] for i in longest_increasing_subsequence(seq)}
+    if len(keep) == len(current_names):
+        return 0
+
+    plan, plan_cost = _plan_reorder(current_names, target_names, keep)
+    first = next(i for i, (a, b) in enumerate(zip(current_names, target_names)) if a != b)
+    sweep_names = target_names[first:]
+
+    clear_shape_keys_selection(key_blocks)
+
+    if len(sweep_names) < plan_cost:
+        for name in sweep_names:
+            obj.active_shape_key_index = key_blocks.find(name)
+            bpy.ops.object.shape_key_move(type="BOTTOM")
+        return len(sweep_names)
+
+    moves = 0
+    for name, destination in plan:
+        moves += move_shape_key_to(obj, key_blocks.find(name), destination)
+    return moves
 
 
 def srgb2lnr(x):